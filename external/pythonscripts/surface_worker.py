@@ -0,0 +1,141 @@
+# Surface Generator Worker
+#
+# Long-lived process serving eTOD and TFPA requests so interpreter startup and
+# the imports (numpy, pyproj) are paid once per worker instead of once per API
+# call.
+#
+# Protocol: one JSON object per line on stdin, one JSON object per line on
+# stdout.
+#
+#   request:  {"id": 1, "generator": "etod", "format": "kml", "lod": "preview",
+#              "args": ["LWSK", "415841.20", ...]}
+#   response: {"id": 1, "chunk": "<?xml ..."}      (zero or more)
+#             {"id": 1, "ok": true}
+#             {"id": 1, "ok": false, "error": "ValueError: ..."}
+#
+# "args" are the same positional arguments the generator scripts take on the
+# command line. "format" (kml, geojson or ndjson), "lod" (survey, standard,
+# preview or a tolerance in metres) and "simplify" (metres) are optional
+# and passed on as --format, --lod and --simplify; "timing": true writes the
+# stage times of the request to stderr (see surfaces.timing). The output
+# is sent in chunks as the generator flushes it, one surface at a time, and
+# the request ends with an "ok" line. A {"ready": true} line is written once
+# the generators are imported, so the caller knows the worker is warm.
+#
+# Results are cached (see surfaces.cache, configured through SURFACE_CACHE_*
+# environment variables). Two commands manage the cache:
+#
+#   {"id": 2, "command": "cache_stats"}  -> {"id": 2, "ok": true, "stats": {...}}
+#   {"id": 3, "command": "cache_clear"}  -> {"id": 3, "ok": true}
+import time
+_started = time.perf_counter()
+from contextlib import redirect_stdout
+import traceback
+import json
+import io
+import sys
+
+from surfaces.cache import SurfaceCache
+from surfaces import timing
+import generate_eTOD
+import generate_TFPA
+
+GENERATORS = {
+    "etod": generate_eTOD,
+    "tfpa": generate_TFPA,
+}
+
+# The first timed request of each generator reports the imports of the
+# whole worker rather than just those of the generator module.
+for name in GENERATORS:
+    timing.imports_done(name, _started)
+
+
+class ChunkWriter(io.TextIOBase):
+    """Text stream that sends everything written to it as "chunk" messages
+    each time it is flushed."""
+
+    def __init__(self, request_id, respond):
+        self.request_id = request_id
+        self.respond = respond
+        self.buffer = []
+
+    def write(self, text):
+        self.buffer.append(text)
+        return len(text)
+
+    def flush(self):
+        if self.buffer:
+            self.respond({"id": self.request_id, "chunk": "".join(self.buffer)})
+            self.buffer = []
+
+
+def handle_command(request, cache):
+    command = request["command"]
+    if command == "cache_stats":
+        return {"stats": cache.info()}
+    if command == "cache_clear":
+        cache.clear()
+        return {}
+    raise ValueError("Unknown command: " + str(command))
+
+
+def handle_request(request, output, cache):
+    generator = GENERATORS.get(request.get("generator"))
+    if generator is None:
+        raise ValueError("Unknown generator: " + str(request.get("generator")))
+
+    argv = [generator.__file__] + [str(arg) for arg in request.get("args", [])]
+    argv += ["--format", request.get("format") or "kml"]
+    for option in ("lod", "simplify"):
+        if request.get(option) is not None:
+            argv += ["--" + option, str(request[option])]
+    if request.get("timing"):
+        argv.append("--timing")
+
+    with redirect_stdout(output):
+        generator.main(argv, cache)
+    output.flush()
+
+
+def main():
+    # Keep the protocol stream for ourselves; anything the generators (or the
+    # libraries they use) print outside a request ends up on stderr.
+    protocol = sys.stdout
+    sys.stdout = sys.stderr
+
+    def respond(message):
+        protocol.write(json.dumps(message) + "\n")
+        protocol.flush()
+
+    cache = SurfaceCache.from_env()
+
+    respond({"ready": True})
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            if "command" in request:
+                result = handle_command(request, cache)
+            else:
+                result = {}
+                handle_request(request, ChunkWriter(request_id, respond), cache)
+        except Exception as error:
+            traceback.print_exc(file=sys.stderr)
+            respond({
+                "id": request_id,
+                "ok": False,
+                "error": type(error).__name__ + ": " + str(error),
+            })
+        else:
+            respond(dict(result, id=request_id, ok=True))
+
+
+if __name__ == "__main__":
+    main()
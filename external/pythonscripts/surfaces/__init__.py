@@ -0,0 +1,93 @@
+"""
+Aerodrome surface generation: Annex 15 eTOD areas and Annex 4 take-off flight
+path areas.
+"""
+from .models import Aerodrome, Runway, RunwayEnd, TFPAParameters
+from .geometry import (
+    LEVELS_OF_DETAIL,
+    DDMMSS_to_UTM,
+    calculate_new_point,
+    create_strip,
+    points_on_arc,
+    resolve_lod,
+    simplify_surfaces,
+    sort_thresholds,
+)
+from .projection import (
+    DDMMSS_to_decimal,
+    surfaces_to_geographic,
+    to_geographic,
+    to_utm,
+    utm_epsg,
+)
+from .etod import (
+    area2a,
+    area2b,
+    area2c,
+    area2d,
+    etod_documents,
+    etod_kml,
+    etod_levels,
+    etod_surfaces,
+    write_etod,
+)
+from .tfpa import tfpa, tfpa_kml, tfpa_surfaces, write_tfpa
+from .serialize import CONTENT_TYPES, write_geojson, write_kml, write_ndjson, write_surfaces
+from .kernel import (
+    PolygonArray,
+    RunwayBatch,
+    area2a_batch,
+    area2b_batch,
+    area2c_batch,
+    area2d_batch,
+    tfpa_batch,
+)
+from .limits import LimitingSurface, aerodrome_surfaces, fallback_overrides
+
+__all__ = [
+    "Aerodrome",
+    "Runway",
+    "RunwayEnd",
+    "TFPAParameters",
+    "LEVELS_OF_DETAIL",
+    "DDMMSS_to_UTM",
+    "calculate_new_point",
+    "create_strip",
+    "points_on_arc",
+    "resolve_lod",
+    "simplify_surfaces",
+    "sort_thresholds",
+    "DDMMSS_to_decimal",
+    "surfaces_to_geographic",
+    "to_geographic",
+    "to_utm",
+    "utm_epsg",
+    "area2a",
+    "area2b",
+    "area2c",
+    "area2d",
+    "etod_documents",
+    "etod_kml",
+    "etod_levels",
+    "etod_surfaces",
+    "write_etod",
+    "tfpa",
+    "tfpa_kml",
+    "tfpa_surfaces",
+    "write_tfpa",
+    "CONTENT_TYPES",
+    "write_geojson",
+    "write_kml",
+    "write_ndjson",
+    "write_surfaces",
+    "PolygonArray",
+    "RunwayBatch",
+    "area2a_batch",
+    "area2b_batch",
+    "area2c_batch",
+    "area2d_batch",
+    "tfpa_batch",
+    "LimitingSurface",
+    "aerodrome_surfaces",
+    "fallback_overrides",
+]
@@ -0,0 +1,150 @@
+# Batch Surface Generator
+#
+# Generates eTOD (and, where parameters are given, TFPA) surfaces for many
+# aerodromes at once, spreading the runways over a process pool.
+#
+# Usage:
+#   python -m surfaces.batch aerodromes.json output_dir [--workers N]
+#       [--lod standard,preview]
+#
+# The input is either a JSON list of aerodromes or a JSON-lines file with one
+# aerodrome per line, each in the layout of surfaces.models.Aerodrome:
+#
+#   {"icao": "LWSK", "arp_lat": "415742", "arp_lon": "213717", "ref_elev": 237,
+#    "runways": [{"end1": {...}, "end2": {...}, "length": 2950, "width": 45,
+#                 "strip_length": 3070, "strip_width": 300}],
+#    "tfpa": {"length": 10000, "inner_width": 180, "divergence": 0.125,
+#             "final_width": 1800, "slope": 0.012}}
+#
+# With several levels of detail the eTOD areas of each runway are generated
+# once and written to one file per level; "standard" keeps the plain file
+# name, other levels get a suffix (ICAO_eTOD_RWY16-34_preview.kml).
+from concurrent.futures import ProcessPoolExecutor
+import traceback
+import argparse
+import json
+import sys
+import os
+
+from .models import Aerodrome
+from .geometry import resolve_lod
+from .etod import etod_documents
+from .tfpa import tfpa_kml
+
+
+def load_aerodromes(path):
+    with open(path, 'r') as f:
+        text = f.read()
+
+    stripped = text.lstrip()
+    if stripped.startswith("["):
+        records = json.loads(stripped)
+    else:
+        records = [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    return [Aerodrome.from_dict(record) for record in records]
+
+
+def _lod_suffix(lod):
+    return "" if lod in (None, "standard") else "_" + str(lod)
+
+
+def batch_tasks(aerodromes, output_dir, lods=("standard",)):
+    """
+    Split the aerodromes into one task per runway and surface type. Each
+    task carries a list of (level of detail, path) pairs; the TFPA has no
+    arcs and is only written once.
+    """
+    tasks = []
+    for aerodrome in aerodromes:
+        for runway in aerodrome.runways:
+            prefix = os.path.join(output_dir, aerodrome.icao, aerodrome.icao)
+            tasks.append(("etod", aerodrome, runway,
+                          [(lod, prefix + "_eTOD_RWY" + runway.name + _lod_suffix(lod) + ".kml")
+                           for lod in lods]))
+            if aerodrome.tfpa is not None:
+                tasks.append(("tfpa", aerodrome, runway,
+                              [(None, prefix + "_TFPA_RWY" + runway.name + ".kml")]))
+    return tasks
+
+
+def run_task(task):
+    """Generate and write the surfaces of one task. Returns (path, error)
+    with the path of the first file of the task."""
+    kind, aerodrome, runway, paths = task
+    try:
+        if kind == "etod":
+            documents = etod_documents(aerodrome, runway, [lod for lod, _ in paths])
+        else:
+            documents = [tfpa_kml(runway, aerodrome.tfpa)]
+
+        for (_, path), kml_data in zip(paths, documents):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                f.write(kml_data)
+    except Exception:
+        return paths[0][1], traceback.format_exc()
+    return paths[0][1], None
+
+
+def run_batch(aerodromes, output_dir, workers=None, lods=("standard",)):
+    """
+    Generate the surfaces of all aerodromes into output_dir.
+
+    Parameters
+    ----------
+    aerodromes : list
+        List of Aerodrome.
+    output_dir : str
+        Directory the KML files are written to, one sub directory per
+        aerodrome.
+    workers : int, optional
+        Number of worker processes, defaults to the number of CPUs.
+    lods : sequence
+        Levels of detail to write the eTOD areas at.
+
+    Returns
+    -------
+    list
+        List of (path, error) for the tasks that failed.
+    """
+    tasks = batch_tasks(aerodromes, output_dir, lods)
+    workers = workers or os.cpu_count() or 1
+    # Hand each worker a few tasks at a time, a single runway is too little
+    # work to amortise the inter-process round trip.
+    chunksize = max(1, len(tasks) // (workers * 4))
+
+    failures = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for path, error in executor.map(run_task, tasks, chunksize=chunksize):
+            if error is not None:
+                failures.append((path, error))
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate eTOD and TFPA surfaces for many aerodromes.")
+    parser.add_argument("input", help="JSON or JSON-lines file of aerodromes")
+    parser.add_argument("output_dir", help="directory to write the KML files to")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: CPU count)")
+    parser.add_argument("--lod", default="standard",
+                        help="comma separated levels of detail of the eTOD areas (default: standard)")
+    args = parser.parse_args(argv)
+
+    lods = args.lod.split(",")
+    for lod in lods:
+        try:
+            resolve_lod(lod)
+        except ValueError as error:
+            parser.error(str(error))
+
+    aerodromes = load_aerodromes(args.input)
+    failures = run_batch(aerodromes, args.output_dir, args.workers, lods)
+
+    for path, error in failures:
+        print("Failed to generate " + path + ":\n" + error, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,340 @@
+# Surface Generator Benchmarks
+#
+# Reproducible benchmarks of the eTOD and TFPA generators on synthetic
+# aerodromes (see surfaces.synthetic):
+#
+#   latency     one request in a warm process, p50/p95/mean and the mean
+#               time of every stage (see surfaces.timing)
+#   cold_start  generate_eTOD.py / generate_TFPA.py as a new process, as the
+#               API used to run them, and the time until a worker is ready
+#   batch       surfaces.batch throughput, eTOD only and eTOD + TFPA
+#   memory      peak RSS of a cold generator process and the peak Python
+#               allocations (tracemalloc) of one warm request
+#
+# Usage:
+#   python -m surfaces.benchmark [--quick] [--output benchmark_results.jsonl]
+#       [--threshold 0.2] [--check]
+#
+# Every run is appended to the output file as one JSON line with the git
+# commit and GENERATOR_VERSION, and compared with the previous line: metrics
+# that got worse by more than the threshold are reported as regressions,
+# and --check makes them fail the run.
+from datetime import datetime, timezone
+from dataclasses import replace
+import subprocess
+import tracemalloc
+import statistics
+import argparse
+import platform
+import tempfile
+import time
+import json
+import sys
+import os
+import io
+
+import numpy as np
+import shapely
+
+from .batch import run_batch
+from .cache import GENERATOR_VERSION
+from .etod import write_etod
+from .limits import aerodrome_surfaces
+from .tfpa import write_tfpa
+from .synthetic import synthetic_aerodromes
+from . import timing
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS = {
+    "etod": "generate_eTOD.py",
+    "tfpa": "generate_TFPA.py",
+}
+
+DEFAULT_OUTPUT = "benchmark_results.jsonl"
+
+
+def etod_args(aerodrome, runway):
+    """Command line arguments of generate_eTOD.py for one runway."""
+    e1, e2 = runway.end1, runway.end2
+    return [aerodrome.icao,
+            e1.threshold_lat, e1.threshold_lon, e1.threshold_elev, e1.designator,
+            e2.threshold_lat, e2.threshold_lon, e2.threshold_elev, e2.designator,
+            e1.end_lat, e1.end_lon, e1.end_elev,
+            e2.end_lat, e2.end_lon, e2.end_elev,
+            aerodrome.arp_lat, aerodrome.arp_lon,
+            e1.clearway, e2.clearway,
+            runway.length, runway.width, runway.strip_length, runway.strip_width,
+            aerodrome.ref_elev]
+
+
+def tfpa_args(aerodrome, runway):
+    """Command line arguments of generate_TFPA.py for one runway."""
+    e1, e2 = runway.end1, runway.end2
+    params = aerodrome.tfpa
+    return [aerodrome.icao,
+            e1.threshold_lat, e1.threshold_lon, e1.threshold_elev, e1.designator,
+            e2.threshold_lat, e2.threshold_lon, e2.threshold_elev, e2.designator,
+            e1.end_lat, e1.end_lon, e1.end_elev,
+            e2.end_lat, e2.end_lon, e2.end_elev,
+            e1.clearway, e2.clearway,
+            params.length, params.inner_width, params.divergence,
+            params.final_width, params.slope]
+
+
+ARGS = {
+    "etod": etod_args,
+    "tfpa": tfpa_args,
+}
+
+
+def _request(generator, aerodrome, runway, stream):
+    if generator == "etod":
+        write_etod(aerodrome, runway, stream)
+    else:
+        write_tfpa(runway, aerodrome.tfpa, stream)
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+def bench_latency(generator, aerodromes, repeat):
+    """Warm single request latency and mean stage times."""
+    runways = [(a, r) for a in aerodromes for r in a.runways]
+    # Warm up: imports, and the transformer of every UTM zone used
+    for aerodrome, runway in runways:
+        _request(generator, aerodrome, runway, io.StringIO())
+
+    samples = []
+    stages = {}
+    for i in range(repeat):
+        aerodrome, runway = runways[i % len(runways)]
+        start = time.perf_counter()
+        with timing.timed(generator, True, io.StringIO()) as timer:
+            _request(generator, aerodrome, runway, io.StringIO())
+        samples.append(time.perf_counter() - start)
+        for name, seconds in timer.stages.items():
+            stages.setdefault(name, []).append(seconds)
+
+    metrics = {
+        "latency_p50_ms": _ms(np.percentile(samples, 50)),
+        "latency_p95_ms": _ms(np.percentile(samples, 95)),
+        "latency_mean_ms": _ms(statistics.fmean(samples)),
+    }
+    for name, values in stages.items():
+        metrics["stage_" + name + "_ms"] = _ms(statistics.fmean(values))
+    return metrics
+
+
+def _run_process(command):
+    """Run command to completion; returns (seconds, peak RSS in MB)."""
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=SCRIPTS_DIR, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.PIPE)
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    stderr = process.stderr.read().decode()
+    process.stderr.close()
+    if process.returncode != 0:
+        raise RuntimeError(" ".join(command) + " failed:\n" + stderr)
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 2**20 if sys.platform == "darwin" else 2**10
+    return elapsed, usage.ru_maxrss / scale
+
+
+def bench_cold_start(generator, aerodromes, repeat):
+    """A new generator process per request: wall time and peak RSS."""
+    aerodrome = aerodromes[0]
+    command = [sys.executable, SCRIPTS[generator]]
+    command += [str(arg) for arg in ARGS[generator](aerodrome, aerodrome.runways[0])]
+
+    samples, peaks = zip(*[_run_process(command) for _ in range(repeat)])
+    return {
+        "cold_start_p50_ms": _ms(np.percentile(samples, 50)),
+        "peak_rss_mb": round(max(peaks), 1),
+    }
+
+
+def bench_tracemalloc(generator, aerodromes):
+    """Peak Python allocations of one warm request."""
+    aerodrome = aerodromes[0]
+    _request(generator, aerodrome, aerodrome.runways[0], io.StringIO())
+    tracemalloc.start()
+    try:
+        _request(generator, aerodrome, aerodrome.runways[0], io.StringIO())
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"tracemalloc_peak_mb": round(peak / 2**20, 3)}
+
+
+def bench_worker_ready(repeat):
+    """Time from starting surface_worker.py until it reports ready."""
+    samples = []
+    env = dict(os.environ, SURFACE_CACHE_DIR="")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable, "surface_worker.py"], cwd=SCRIPTS_DIR,
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                   stderr=subprocess.DEVNULL, env=env)
+        line = process.stdout.readline()
+        samples.append(time.perf_counter() - start)
+        process.stdin.close()
+        process.wait()
+        process.stdout.close()
+        if not json.loads(line or "{}").get("ready"):
+            raise RuntimeError("surface_worker.py did not become ready")
+    return {"ready_p50_ms": _ms(np.percentile(samples, 50))}
+
+
+def bench_batch(aerodromes, workers):
+    """surfaces.batch throughput with and without the TFPA surfaces."""
+    etod_only = [replace(a, tfpa=None) for a in aerodromes]
+    runways = sum(len(a.runways) for a in aerodromes)
+    metrics = {}
+    for name, batch, files in (("etod", etod_only, runways), ("all", aerodromes, 2 * runways)):
+        with tempfile.TemporaryDirectory() as output_dir:
+            start = time.perf_counter()
+            failures = run_batch(batch, output_dir, workers)
+            elapsed = time.perf_counter() - start
+        if failures:
+            raise RuntimeError("Batch failed:\n" + failures[0][1])
+        metrics[name + "_files_per_s"] = round(files / elapsed, 1)
+    return metrics
+
+
+def check_geometry(aerodromes):
+    """Raise RuntimeError if any limiting surface of the aerodromes is not a valid polygon."""
+    for aerodrome in aerodromes:
+        _, surfaces = aerodrome_surfaces(aerodrome)
+        invalid = [s.name for s in surfaces
+                   if not shapely.is_valid(shapely.Polygon(s.polygon[:, :2]))]
+        if invalid:
+            raise RuntimeError("Invalid surfaces of " + aerodrome.icao + ": " + ", ".join(invalid))
+
+
+def run_benchmarks(quick=False, seed=0, workers=None, log=None):
+    """
+    Run every benchmark.
+
+    Returns
+    -------
+    dict
+        Flat mapping of metric name (e.g. "etod.latency_p50_ms") to value.
+    """
+    log = log or (lambda message: None)
+    aerodromes = synthetic_aerodromes(10 if quick else 40, seed)
+    batch_aerodromes = synthetic_aerodromes(20 if quick else 200, seed + 1)
+    repeat = 20 if quick else 200
+    cold_repeat = 2 if quick else 5
+    check_geometry(aerodromes + batch_aerodromes)
+
+    metrics = {}
+    for generator in ("etod", "tfpa"):
+        log("latency " + generator)
+        results = bench_latency(generator, aerodromes, repeat)
+        log("cold start " + generator)
+        results.update(bench_cold_start(generator, aerodromes, cold_repeat))
+        results.update(bench_tracemalloc(generator, aerodromes))
+        metrics.update({generator + "." + name: value for name, value in results.items()})
+
+    log("worker")
+    metrics.update({"worker." + name: value for name, value in bench_worker_ready(cold_repeat).items()})
+    log("batch")
+    metrics.update({"batch." + name: value for name, value in bench_batch(batch_aerodromes, workers).items()})
+    return metrics
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SCRIPTS_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_results(path):
+    """All previous runs in a results file, oldest first."""
+    if not os.path.exists(path):
+        return []
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def higher_is_better(name):
+    return name.endswith("_per_s")
+
+
+def compare(previous, current, threshold):
+    """
+    Compare the metrics of two runs.
+
+    Returns
+    -------
+    list
+        (name, previous, current, relative change, regression) for every
+        metric of both runs. A regression is a change for the worse of more
+        than threshold (0.2 = 20%).
+    """
+    rows = []
+    for name, value in current.items():
+        old = previous.get(name)
+        if not old or value is None:
+            continue
+        change = (value - old) / old
+        worse = -change if higher_is_better(name) else change
+        rows.append((name, old, value, change, worse > threshold))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the surface generators.")
+    parser.add_argument("--quick", action="store_true", help="fewer repetitions, for a smoke test")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic aerodromes")
+    parser.add_argument("--workers", type=int, default=None, help="batch worker processes")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="results file (JSON-lines)")
+    parser.add_argument("--no-save", action="store_true", help="do not append this run to the results")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative change reported as a regression (default: 0.2)")
+    parser.add_argument("--check", action="store_true", help="exit with 1 when there is a regression")
+    args = parser.parse_args(argv)
+
+    log = lambda message: print("running " + message, file=sys.stderr)
+    metrics = run_benchmarks(args.quick, args.seed, args.workers, log)
+
+    run = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "generator_version": GENERATOR_VERSION,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "quick": args.quick,
+        "metrics": metrics,
+    }
+
+    # Only compare like with like: quick runs with quick runs
+    previous = [r for r in load_results(args.output) if r.get("quick") == args.quick]
+    rows = compare(previous[-1]["metrics"], metrics, args.threshold) if previous else []
+
+    if rows:
+        print("%-32s %12s %12s %8s" % ("metric", "previous", "current", "change"))
+        for name, old, value, change, regression in rows:
+            print("%-32s %12g %12g %+7.1f%%%s" % (name, old, value, change * 100,
+                                                   "  REGRESSION" if regression else ""))
+    else:
+        for name, value in metrics.items():
+            print("%-32s %12g" % (name, value))
+
+    if not args.no_save:
+        with open(args.output, "a") as f:
+            f.write(json.dumps(run) + "\n")
+
+    regressions = [row for row in rows if row[4]]
+    return 1 if args.check and regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,454 @@
+# Surface Result Cache
+#
+# Serialized surfaces keyed by a hash of the normalized generator inputs, so a
+# repeated request skips geometry and serialization entirely. Two tiers:
+#
+#   memory  bounded LRU inside the process
+#   disk    a directory shared by all processes (e.g. the worker pool), with
+#           size based eviction of the least recently used entries; the
+#           total size is kept in a size file updated under a lock
+#
+# Keys include GENERATOR_VERSION; bump it whenever the generated output
+# changes so old entries are never served. To drop everything explicitly run
+#
+#   python -m surfaces.cache clear [--cache-dir DIR]
+#
+# which also tells running processes to drop their memory tier.
+#
+# The cache is only an optimization: errors of the disk tier (unwritable
+# directory, disk full) are logged to stderr and handled as a miss or a
+# skipped write, and a directory that cannot be set up disables the tier.
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import asdict
+import argparse
+import tempfile
+import hashlib
+import fcntl
+import json
+import sys
+import os
+
+from .geometry import resolve_lod
+from . import timing
+
+# Bump whenever the generated output changes.
+GENERATOR_VERSION = 3
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "surface_cache")
+EPOCH_FILE = "epoch"
+SIZE_FILE = "size"
+
+
+def _number(value):
+    return float(value)
+
+
+def _normalize_end(end):
+    values = {key: _number(value) for key, value in asdict(end).items() if key != "designator"}
+    values["designator"] = str(end.designator)
+    return values
+
+
+def _normalize_runway(runway):
+    return {
+        "end1": _normalize_end(runway.end1),
+        "end2": _normalize_end(runway.end2),
+        "length": _number(runway.length),
+        "width": _number(runway.width),
+        "strip_length": _number(runway.strip_length),
+        "strip_width": _number(runway.strip_width),
+    }
+
+
+def _hash(kind, inputs, format):
+    canonical = json.dumps({
+        "version": GENERATOR_VERSION,
+        "kind": kind,
+        "format": format,
+        "inputs": inputs,
+    }, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _detail(tolerance, simplify):
+    # Only non-default options become part of the key, so entries written
+    # before they existed stay valid.
+    detail = {}
+    if tolerance is not None:
+        detail["tolerance"] = _number(tolerance)
+    if simplify:
+        detail["simplify"] = _number(simplify)
+    return detail
+
+
+def etod_key(aerodrome, runway, format="kml", lod=None, simplify=None):
+    """Cache key of the eTOD areas of one runway. The ICAO code and other
+    runways of the aerodrome do not change the output and are left out."""
+    return _hash("etod", dict({
+        "arp_lat": _number(aerodrome.arp_lat),
+        "arp_lon": _number(aerodrome.arp_lon),
+        "ref_elev": _number(aerodrome.ref_elev),
+        "runway": _normalize_runway(runway),
+    }, **_detail(resolve_lod(lod), simplify)), format)
+
+
+def tfpa_key(runway, params, format="kml", lod=None, simplify=None):
+    """Cache key of the TFPA surfaces of one runway. The TFPA has no arcs,
+    so the level of detail is left out."""
+    return _hash("tfpa", dict({
+        "runway": _normalize_runway(runway),
+        "params": {key: _number(value) for key, value in asdict(params).items()},
+    }, **_detail(None, simplify)), format)
+
+
+class _Tee:
+    """Text stream writing to another stream while keeping a copy."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.parts = []
+
+    def write(self, text):
+        self.parts.append(text)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def getvalue(self):
+        return "".join(self.parts)
+
+
+class SurfaceCache:
+    """
+    Two tier cache of serialized surfaces.
+
+    Parameters
+    ----------
+    memory_bytes : int
+        Maximum size of the in-memory LRU tier. 0 disables it.
+    cache_dir : str, optional
+        Directory of the on-disk tier. None disables it.
+    disk_bytes : int
+        Maximum size of the on-disk tier; the least recently used files are
+        removed once it is exceeded.
+    """
+
+    def __init__(self, memory_bytes=64 * 2**20, cache_dir=None, disk_bytes=512 * 2**20):
+        self.memory_bytes = memory_bytes
+        self.cache_dir = cache_dir
+        self.disk_bytes = disk_bytes
+
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._disk_size = 0
+        self._epoch = None
+
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+            "disk_errors": 0,
+        }
+
+        if cache_dir is not None:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                # Rescan at startup to correct any drift of the shared size,
+                # e.g. from a process killed between writing a file and counting it.
+                with self._size_lock() as f:
+                    self._write_size(f, sum(size for _, _, size in self._disk_entries()))
+                self._epoch = self._read_epoch()
+            except OSError as error:
+                self._disk_error("disabled the disk tier", error)
+                self.cache_dir = None
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build a cache from SURFACE_CACHE_MEMORY_MB (default 64),
+        SURFACE_CACHE_DIR (default a directory in the system temp dir, "" to
+        disable the disk tier) and SURFACE_CACHE_DISK_MB (default 512).
+        """
+        cache_dir = os.environ.get("SURFACE_CACHE_DIR", DEFAULT_CACHE_DIR) or None
+        return cls(
+            memory_bytes=int(float(os.environ.get("SURFACE_CACHE_MEMORY_MB", 64)) * 2**20),
+            cache_dir=cache_dir,
+            disk_bytes=int(float(os.environ.get("SURFACE_CACHE_DISK_MB", 512)) * 2**20),
+        )
+
+    # Lookup
+
+    def get(self, key):
+        """Return the cached value of key, or None."""
+        self._check_epoch()
+
+        value = self._memory.get(key)
+        if value is not None:
+            self._memory.move_to_end(key)
+            self.stats["hits"] += 1
+            self.stats["memory_hits"] += 1
+            return value
+
+        value = self._disk_get(key)
+        if value is not None:
+            self._memory_put(key, value)
+            self.stats["hits"] += 1
+            self.stats["disk_hits"] += 1
+            return value
+
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, key, value):
+        self._memory_put(key, value)
+        self._disk_put(key, value)
+
+    def write_through(self, key, write, stream):
+        """
+        Write the value of key to stream, calling write(stream) to produce it
+        on a miss. Output produced on a miss still reaches stream as it is
+        written and is stored once complete.
+        """
+        with timing.stage("cache_get"):
+            value = self.get(key)
+        if value is not None:
+            with timing.stage("serialize"):
+                stream.write(value)
+                stream.flush()
+            return
+
+        tee = _Tee(stream)
+        write(tee)
+        with timing.stage("cache_put"):
+            self.put(key, tee.getvalue())
+
+    # Invalidation
+
+    def invalidate(self, key):
+        """Remove one entry from both tiers."""
+        value = self._memory.pop(key, None)
+        if value is not None:
+            self._memory_size -= len(value)
+        if self.cache_dir is not None:
+            path = self._path(key)
+            try:
+                with self._size_lock() as f:
+                    try:
+                        size = os.path.getsize(path)
+                        os.remove(path)
+                    except FileNotFoundError:
+                        return
+                    self._write_size(f, self._read_size(f) - size)
+            except OSError as error:
+                self._disk_error("could not remove " + path, error)
+
+    def clear(self):
+        """
+        Remove every entry from both tiers. Other processes sharing the
+        disk tier drop their memory tier on their next lookup.
+        """
+        self._memory.clear()
+        self._memory_size = 0
+        if self.cache_dir is not None:
+            with self._size_lock() as f:
+                for path, _, _ in self._disk_entries():
+                    self._remove(path)
+                self._write_size(f, 0)
+            with open(os.path.join(self.cache_dir, EPOCH_FILE), "w") as f:
+                f.write(os.urandom(8).hex())
+            self._epoch = self._read_epoch()
+
+    def info(self):
+        """Counters plus current entry counts and sizes."""
+        if self.cache_dir is not None:
+            try:
+                with self._size_lock() as f:
+                    self._disk_size = self._read_size(f)
+            except OSError as error:
+                self._disk_error("could not read the disk tier size", error)
+        return dict(
+            self.stats,
+            memory_entries=len(self._memory),
+            memory_bytes=self._memory_size,
+            disk_bytes=self._disk_size,
+        )
+
+    # Memory tier
+
+    def _memory_put(self, key, value):
+        if len(value) > self.memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_size -= len(old)
+        self._memory[key] = value
+        self._memory_size += len(value)
+
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+            self.stats["memory_evictions"] += 1
+
+    def _read_epoch(self):
+        try:
+            with open(os.path.join(self.cache_dir, EPOCH_FILE), "r") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as error:
+            # Keep the memory tier rather than dropping it on every lookup
+            self._disk_error("could not read the epoch", error)
+            return self._epoch
+
+    def _check_epoch(self):
+        if self.cache_dir is None:
+            return
+        epoch = self._read_epoch()
+        if epoch != self._epoch:
+            self._memory.clear()
+            self._memory_size = 0
+            self._epoch = epoch
+
+    # Disk tier
+
+    def _disk_error(self, action, error):
+        self.stats["disk_errors"] += 1
+        print("Surface cache: " + action + ": " + str(error), file=sys.stderr)
+
+    @contextmanager
+    def _size_lock(self):
+        """Open the shared size file and hold an exclusive lock on it."""
+        fd = os.open(os.path.join(self.cache_dir, SIZE_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        with os.fdopen(fd, "r+") as f:
+            # Released when the file is closed
+            fcntl.flock(f, fcntl.LOCK_EX)
+            yield f
+
+    def _read_size(self, f):
+        f.seek(0)
+        try:
+            return int(f.read() or 0)
+        except ValueError:
+            return 0
+
+    def _write_size(self, f, size):
+        size = max(size, 0)
+        f.seek(0)
+        f.truncate()
+        f.write(str(size))
+        f.flush()
+        self._disk_size = size
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def _disk_entries(self):
+        """(path, mtime, size) of every cached file."""
+        entries = []
+        for directory in os.listdir(self.cache_dir):
+            directory = os.path.join(self.cache_dir, directory)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((path, stat.st_mtime, stat.st_size))
+        return entries
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _disk_get(self, key):
+        if self.cache_dir is None:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = f.read()
+            # The modification time doubles as the last use for eviction
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except OSError as error:
+            self._disk_error("could not read " + path, error)
+            return None
+        return value
+
+    def _disk_put(self, key, value):
+        if self.cache_dir is None:
+            return
+        path = self._path(key)
+        temp_path = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            # Write to a temporary file and rename it, so other processes never
+            # read a partial entry.
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(value)
+            size = os.path.getsize(temp_path)
+
+            with self._size_lock() as f:
+                # An overwritten entry only counts once
+                try:
+                    size -= os.path.getsize(path)
+                except FileNotFoundError:
+                    pass
+                os.replace(temp_path, path)
+                temp_path = None
+                total = self._read_size(f) + size
+                if total > self.disk_bytes:
+                    total = self._disk_evict()
+                self._write_size(f, total)
+        except OSError as error:
+            self._disk_error("could not write " + path, error)
+            if temp_path is not None:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+
+    def _disk_evict(self):
+        """Evict the least recently used files; called with the size lock held.
+        Returns the new total size."""
+        # Re-read the size from the directory, the shared one may have
+        # drifted, and evict down to 90% of the limit so this does not run
+        # every put.
+        entries = sorted(self._disk_entries(), key=lambda entry: entry[1])
+        size = sum(entry[2] for entry in entries)
+        target = self.disk_bytes * 0.9
+        for path, _, entry_size in entries:
+            if size <= target:
+                break
+            self._remove(path)
+            size -= entry_size
+            self.stats["disk_evictions"] += 1
+        return size
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or clear the surface result cache.")
+    parser.add_argument("command", choices=["stats", "clear"])
+    parser.add_argument("--cache-dir", default=os.environ.get("SURFACE_CACHE_DIR", DEFAULT_CACHE_DIR))
+    args = parser.parse_args(argv)
+
+    cache = SurfaceCache(memory_bytes=0, cache_dir=args.cache_dir)
+    if args.command == "clear":
+        cache.clear()
+    print(json.dumps({"cache_dir": args.cache_dir, "disk_bytes": cache.info()["disk_bytes"]}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# eTOD Surfaces (Annex 15, Area 2)
+import io
+
+import numpy as np
+
+from .geometry import sort_thresholds, DDMMSS_to_UTM, resolve_lod, simplify_surfaces
+from .projection import surfaces_to_geographic, utm_epsg
+from .kernel import RunwayBatch, area2a_batch, area2b_batch, area2c_batch, area2d_batch
+from .serialize import write_surfaces
+from . import timing
+
+#eTOD Surfaces Inputs
+
+s_etod = 0.012
+l_etod = 10000
+r_etod = 45000
+h_etod = 120
+div_etod = 0.15
+# Area 2a collection surface, above the nearest runway elevation
+h_area2a = 3
+
+
+def _runway_batch(t1, t2, runway, strip, azimuth):
+    return RunwayBatch.from_thresholds([(t1, t2, azimuth, runway, strip)])
+
+
+def area2a(t1,t2,runway,strip,azimuth):
+    return area2a_batch(_runway_batch(t1, t2, runway, strip, azimuth))[0].tolist()
+
+def area2b(t1,t2,l,s,div,runway,strip,azimuth,tolerance=None):
+    coordinates1, coordinates2 = area2b_batch(_runway_batch(t1, t2, runway, strip, azimuth), l, s, div, tolerance)
+    return coordinates1[0].tolist(), coordinates2[0].tolist()
+
+def area2c(t1,t2,l,s,div,runway,strip,azimuth,tolerance=None):
+    coordinates1, coordinates2 = area2c_batch(_runway_batch(t1, t2, runway, strip, azimuth), l, s, div, tolerance)
+    return coordinates1[0].tolist(), coordinates2[0].tolist()
+
+def area2d(arp, radius, elev, resolution=360, tolerance=None):
+    return area2d_batch(np.array([arp[:2]], dtype=np.float64), radius, elev, resolution, tolerance)[0].tolist()
+
+
+def etod_levels(aerodrome, runway, lods=(None,), simplify=None):
+    """
+    Build the Area 2a, 2b, 2c and 2d polygons of one runway at several
+    levels of detail in one pass.
+
+    The runway is projected once and the arcs of every level are computed in
+    the same kernel call; Area 2a has no arcs and is shared.
+
+    Parameters
+    ----------
+    aerodrome : Aerodrome
+        Aerodrome the runway belongs to; provides the ARP and the reference
+        elevation.
+    runway : Runway
+        Runway to build the areas for.
+    lods : sequence
+        Levels of detail, see geometry.resolve_lod.
+    simplify : float, optional
+        Tolerance in metres of a topology preserving simplification applied
+        to every polygon.
+
+    Returns
+    -------
+    tuple
+        Tuple of the EPSG code the vertices are in and a list with one dict
+        per level, mapping surface names (e.g. "Area_2a_RWY16-34") to lists
+        of polygons.
+    """
+    tolerance = np.array([np.nan if t is None else t for t in map(resolve_lod, lods)])
+    n = len(tolerance)
+
+    with timing.stage("project"):
+        epsg = utm_epsg(aerodrome.arp_lat, aerodrome.arp_lon)
+        t1, t2, azimuth = sort_thresholds(runway, epsg)
+        _, arp_x, arp_y = DDMMSS_to_UTM(aerodrome.arp_lat, aerodrome.arp_lon, epsg)
+
+    runway_dims = [runway.length, runway.width]
+    strip = [runway.strip_length, runway.strip_width]
+    name = "_RWY" + t1[3] + "-" + t2[3]
+
+    with timing.stage("geometry"):
+        runways = RunwayBatch.from_thresholds([(t1, t2, azimuth, runway_dims, strip)] * n)
+        coordinates2a = area2a(t1,t2,runway_dims,strip,azimuth)
+        coordinates2b = area2b_batch(runways, l_etod, s_etod, div_etod, tolerance)
+        coordinates2c = area2c_batch(runways, l_etod, s_etod, div_etod, tolerance)
+        coordinates2d = area2d_batch(np.array([[arp_x, arp_y]] * n), r_etod,
+                                     float(aerodrome.ref_elev) + h_etod, tolerance=tolerance)
+
+        levels = [{
+            "Area_2a" + name: [coordinates2a],
+            "Area_2b" + name: [side[i].tolist() for side in coordinates2b],
+            "Area_2c" + name: [side[i].tolist() for side in coordinates2c],
+            "Area_2d" + name: [coordinates2d[i].tolist()],
+        } for i in range(n)]
+
+    if simplify:
+        with timing.stage("simplify"):
+            levels = [simplify_surfaces(surfaces, simplify) for surfaces in levels]
+    return epsg, levels
+
+
+def etod_surfaces(aerodrome, runway, lod=None, simplify=None):
+    """
+    Build the Area 2a, 2b, 2c and 2d polygons of one runway.
+
+    Parameters
+    ----------
+    aerodrome : Aerodrome
+        Aerodrome the runway belongs to; provides the ARP and the reference
+        elevation.
+    runway : Runway
+        Runway to build the areas for.
+    lod, simplify
+        Level of detail and simplification, see etod_levels.
+
+    Returns
+    -------
+    tuple
+        Tuple of the EPSG code the vertices are in and a dict mapping surface
+        names (e.g. "Area_2a_RWY16-34") to lists of polygons.
+    """
+    epsg, (surfaces,) = etod_levels(aerodrome, runway, [lod], simplify)
+    return epsg, surfaces
+
+
+def _layers(surfaces):
+    return ((surface_name.split("_RWY")[0].split("-")[-1], coordinates)
+            for surface_name, coordinates in surfaces.items())
+
+
+def write_etod(aerodrome, runway, stream, format="kml", lod=None, simplify=None):
+    """
+    Generate the eTOD areas of one runway and write them to stream as one
+    KML (or GeoJSON / NDJSON) document, flushing after every area.
+    """
+    epsg, surfaces = etod_surfaces(aerodrome, runway, lod, simplify)
+    with timing.stage("to_geographic"):
+        surfaces = surfaces_to_geographic(surfaces, epsg)
+    with timing.stage("serialize"):
+        write_surfaces(_layers(surfaces), stream, format)
+
+
+def etod_kml(aerodrome, runway, format="kml", lod=None, simplify=None):
+    """Generate the eTOD areas of one runway as a KML document string."""
+    output = io.StringIO()
+    write_etod(aerodrome, runway, output, format, lod, simplify)
+    return output.getvalue()
+
+
+def etod_documents(aerodrome, runway, lods, format="kml", simplify=None):
+    """
+    Generate the eTOD areas of one runway at several levels of detail from
+    one generation pass; returns one document string per level.
+    """
+    epsg, levels = etod_levels(aerodrome, runway, lods, simplify)
+    merged = {(i, surface_name): coordinates
+              for i, surfaces in enumerate(levels)
+              for surface_name, coordinates in surfaces.items()}
+    with timing.stage("to_geographic"):
+        merged = surfaces_to_geographic(merged, epsg)
+
+    documents = []
+    with timing.stage("serialize"):
+        for i, surfaces in enumerate(levels):
+            output = io.StringIO()
+            write_surfaces(_layers({name: merged[(i, name)] for name in surfaces}), output, format)
+            documents.append(output.getvalue())
+    return documents
@@ -0,0 +1,173 @@
+import math
+
+import numpy as np
+import shapely
+
+from .kernel import arc_points
+from .projection import to_utm, utm_epsg
+
+
+def DDMMSS_to_UTM(lat, lon, epsg=None):
+    """
+    Project a DDMMSS.SS point to UTM.
+
+    The point is projected to ``epsg`` when given, otherwise to the UTM zone
+    it lies in.
+
+    Returns
+    -------
+    tuple
+        Tuple of EPSG code, easting and northing.
+    """
+    if epsg is None:
+        epsg = utm_epsg(lat, lon)
+    utm_easting, utm_northing = to_utm(lat, lon, epsg)
+    return epsg, utm_easting, utm_northing
+
+
+# define function to calculate new point coordinates based on distance, azimuth, and slope
+def calculate_new_point(x, y, z, distance, azimuth, slope, divergence):
+    """
+    Calculate new point coordinates based on distance, azimuth, and slope.
+
+    Parameters
+    ----------
+    x : float
+        X coordinate of starting point.
+    y : float
+        Y coordinate of starting point.
+    distance : float
+        Distance between starting point and new point.
+    azimuth : float
+        Azimuth angle from starting point to new point in degrees.
+    slope : float
+        Slope angle from starting point to new point in degrees.
+
+    Returns
+    -------
+    tuple
+        Tuple of X and Y coordinates of new point.
+    """
+    # convert angles to radians
+    azimuth_rad = math.radians(azimuth)
+    divergence_rad = math.atan(divergence)
+    azimuth_divergence = azimuth_rad + divergence_rad
+
+    inclined_distance = distance / math.cos(divergence_rad)
+
+    # calculate new point coordinates
+    x_new = x + (inclined_distance * math.sin(azimuth_divergence))
+    y_new = y + (inclined_distance * math.cos(azimuth_divergence))
+    z_new = z + (distance * slope)
+
+    return x_new, y_new, z_new
+
+
+arc_degree = 1
+
+# Levels of detail: the largest distance in metres between an arc and the
+# chords it is drawn with. "standard" (None) keeps the fixed arc_degree step
+# and the 360 vertex Area 2d circle.
+LEVELS_OF_DETAIL = {
+    "survey": 0.1,
+    "standard": None,
+    "preview": 25.0,
+}
+
+
+def resolve_lod(lod):
+    """
+    Chord tolerance in metres of a level of detail: a LEVELS_OF_DETAIL name,
+    a number (or numeric string) of metres, or None for "standard".
+    """
+    if lod is None or lod in LEVELS_OF_DETAIL:
+        return LEVELS_OF_DETAIL.get(lod)
+    try:
+        tolerance = float(lod)
+    except (TypeError, ValueError):
+        raise ValueError("Unknown level of detail: " + str(lod))
+    if not tolerance > 0:
+        raise ValueError("Level of detail tolerance must be positive: " + str(lod))
+    return tolerance
+
+
+def points_on_arc(center, start, end, elevation, direction, degree_interval=arc_degree, tolerance=None):
+    arcs = arc_points(np.array([center[:2]], dtype=np.float64),
+                      np.array([start[:2]], dtype=np.float64),
+                      np.array([end[:2]], dtype=np.float64),
+                      elevation, direction, degree_interval, tolerance)
+    return [tuple(point) for point in arcs[0].tolist()]
+
+
+def simplify_surfaces(surfaces, tolerance):
+    """
+    Simplify every polygon of a surfaces dict (UTM, see etod_surfaces) with
+    the topology preserving Douglas-Peucker algorithm. tolerance is in
+    metres; vertex elevations are kept.
+    """
+    simplified = {}
+    for name, polygons in surfaces.items():
+        geometries = [shapely.Polygon(np.asarray(polygon, dtype=np.float64)) for polygon in polygons]
+        geometries = shapely.simplify(geometries, tolerance, preserve_topology=True)
+        simplified[name] = [shapely.get_coordinates(geometry, include_z=True) for geometry in geometries]
+    return simplified
+
+
+def sort_thresholds(runway, epsg):
+    """
+    Project both ends of a runway and order them west to east.
+
+    Each end becomes a list [x, y, elev, designator, end_x, end_y, end_elev,
+    clearway] with -1 (t1) or 1 (t2) appended; this is the layout the surface
+    functions index into.
+
+    Returns
+    -------
+    tuple
+        Tuple of t1, t2 and the runway azimuth in degrees. t1 is the western
+        end and t2 the eastern end.
+    """
+    ends = (runway.end1, runway.end2)
+    # Project the thresholds and runway ends of both sides in one call
+    x, y = to_utm([v for end in ends for v in (end.threshold_lat, end.end_lat)],
+                  [v for end in ends for v in (end.threshold_lon, end.end_lon)],
+                  epsg)
+
+    e1, e2 = [[float(x[2*i]), float(y[2*i]), float(end.threshold_elev), end.designator,
+               float(x[2*i+1]), float(y[2*i+1]), float(end.end_elev), float(end.clearway)]
+              for i, end in enumerate(ends)]
+
+    if e1[0] > e2[0]:
+        t1, t2 = e2, e1
+    else:
+        t1, t2 = e1, e2
+
+    t2.append(1)
+    t1.append(-1)
+
+    # Slope of center line in caresian coordinate system
+    m = (t2[1] - t1[1]) / (t2[0] - t1[0])
+
+    # Angle between center line and x axis
+    alpha = math.atan(m)
+    azimuth = math.degrees(math.pi / 2 - alpha)
+
+    return t1, t2, azimuth
+
+
+def create_strip(t1, t2, runway, strip, azimuth):
+
+    w = strip[1]
+    d = (strip[0] - runway[0]) / 2
+
+    s1 = calculate_new_point(t1[4], t1[5], t1[6], w/2, azimuth-90, 0, 0)
+    s2 = calculate_new_point(t1[4], t1[5], t1[6], d, azimuth, 0, -w/2/d)
+    s3 = calculate_new_point(t1[4], t1[5], t1[6], d, azimuth, 0, w/2/d)
+    s4 = calculate_new_point(t1[4], t1[5], t1[6], w/2, azimuth+90, 0, 0)
+
+    s5 = calculate_new_point(t2[4], t2[5], t2[6], w/2, azimuth-180-90, 0, 0)
+    s6 = calculate_new_point(t2[4], t2[5], t2[6], d, azimuth-180, 0, -w/2/d)
+    s7 = calculate_new_point(t2[4], t2[5], t2[6], d, azimuth-180, 0, w/2/d)
+    s8 = calculate_new_point(t2[4], t2[5], t2[6], w/2, azimuth-180+90, 0, 0)
+
+    return [s1, s2, s3, s4, s5, s6, s7, s8, s1]
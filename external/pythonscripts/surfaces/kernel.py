@@ -0,0 +1,353 @@
+# Vectorized Surface Geometry
+#
+# NumPy versions of calculate_new_point, points_on_arc and the area builders
+# that compute the vertices of many runways at once. Every function takes a
+# leading batch dimension of N runways and returns PolygonArray, i.e. all
+# vertices in one contiguous (M, 3) float64 array plus offsets.
+#
+# The results match the scalar formulas they replace to within 1e-6 m
+# (in practice a few ulp); the number of arc vertices is computed with the
+# same truncation, so vertex counts are identical.
+#
+# Arcs are densified either with a fixed angle step (the default, as the
+# scalar code did) or from a tolerance: the largest distance in metres
+# allowed between the arc and its chords. Tolerances can differ per polygon,
+# so several levels of detail can be built in one call; NaN selects the
+# fixed step for that polygon.
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass
+class PolygonArray:
+    """
+    A ragged array of polygons.
+
+    Polygon ``i`` is ``coords[offsets[i]:offsets[i + 1]]``.
+    """
+    coords: np.ndarray
+    offsets: np.ndarray
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.coords[self.offsets[i]:self.offsets[i + 1]]
+
+    @property
+    def counts(self):
+        return np.diff(self.offsets)
+
+    @classmethod
+    def from_fixed(cls, vertices):
+        """Build from an (N, V, 3) array of N polygons with V vertices each."""
+        n, v, _ = vertices.shape
+        offsets = np.arange(0, (n + 1) * v, v, dtype=np.int64)
+        return cls(np.ascontiguousarray(vertices.reshape(n * v, 3), dtype=np.float64), offsets)
+
+    @classmethod
+    def from_counts(cls, coords, counts):
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return cls(coords, offsets)
+
+
+@dataclass
+class RunwayBatch:
+    """
+    N runways as arrays, in the layout of sort_thresholds.
+
+    end1/end2 are the (N, 3) runway end points of t1 and t2 (t[4:7]),
+    clearway1/clearway2 the clearways (t[7]) and azimuth the runway azimuth in
+    degrees. Runway and strip dimensions are only needed for Area 2a-2c.
+    """
+    end1: np.ndarray
+    end2: np.ndarray
+    clearway1: np.ndarray
+    clearway2: np.ndarray
+    azimuth: np.ndarray
+    runway_length: np.ndarray = None
+    strip_length: np.ndarray = None
+    strip_width: np.ndarray = None
+
+    def __len__(self):
+        return len(self.azimuth)
+
+    @classmethod
+    def from_thresholds(cls, runways):
+        """
+        Build from a list of (t1, t2, azimuth, runway, strip) tuples, where
+        t1, t2 and azimuth come from sort_thresholds and runway/strip are
+        [length, width] pairs.
+        """
+        t1s, t2s, azimuths, runway_dims, strips = zip(*runways)
+        return cls(
+            end1=np.array([t[4:7] for t in t1s], dtype=np.float64),
+            end2=np.array([t[4:7] for t in t2s], dtype=np.float64),
+            clearway1=np.array([t[7] for t in t1s], dtype=np.float64),
+            clearway2=np.array([t[7] for t in t2s], dtype=np.float64),
+            azimuth=np.array(azimuths, dtype=np.float64),
+            runway_length=np.array([r[0] for r in runway_dims], dtype=np.float64),
+            strip_length=np.array([s[0] for s in strips], dtype=np.float64),
+            strip_width=np.array([s[1] for s in strips], dtype=np.float64),
+        )
+
+
+def new_points(points, distance, azimuth, slope, divergence):
+    """
+    Vectorized calculate_new_point.
+
+    Parameters
+    ----------
+    points : ndarray
+        (N, 3) starting points.
+    distance, azimuth, slope, divergence : float or ndarray
+        As in calculate_new_point, scalars or (N,) arrays.
+
+    Returns
+    -------
+    ndarray
+        (N, 3) new points.
+    """
+    azimuth_divergence = np.radians(azimuth) + np.arctan(divergence)
+    inclined_distance = distance / np.cos(np.arctan(divergence))
+
+    new = np.empty(points.shape, dtype=np.float64)
+    new[:, 0] = points[:, 0] + inclined_distance * np.sin(azimuth_divergence)
+    new[:, 1] = points[:, 1] + inclined_distance * np.cos(azimuth_divergence)
+    new[:, 2] = points[:, 2] + distance * slope
+    return new
+
+
+def chord_angle(radius, tolerance):
+    """
+    Largest angle step in radians for which the chords of an arc of radius
+    stay within tolerance of it. Capped at 45 degrees.
+    """
+    ratio = np.clip(1 - tolerance / radius, -1, 1)
+    return np.minimum(2 * np.arccos(ratio), np.pi / 4)
+
+
+def arc_points(center, start, end, elevation, direction, degree_interval=1, tolerance=None):
+    """
+    Vectorized points_on_arc for N arcs.
+
+    Parameters
+    ----------
+    center, start, end : ndarray
+        (N, 2) or (N, 3) arc centers, start and end points.
+    elevation : ndarray
+        (N,) elevation given to the arc vertices.
+    direction : str
+        "ccw" or "cw".
+    degree_interval : float
+        Maximum angle between two vertices in degrees.
+    tolerance : float or ndarray, optional
+        Maximum chord deviation in metres, a scalar or (N,) array. Replaces
+        degree_interval where given (not NaN).
+
+    Returns
+    -------
+    PolygonArray
+        N arcs, each running from start to end.
+    """
+    cx, cy = center[:, 0], center[:, 1]
+    radius = np.sqrt((cx - start[:, 0]) ** 2 + (cy - start[:, 1]) ** 2)
+    start_angle = np.arctan2(start[:, 1] - cy, start[:, 0] - cx)
+    end_angle = np.arctan2(end[:, 1] - cy, end[:, 0] - cx)
+
+    if direction == "ccw":
+        end_angle = np.where(end_angle <= start_angle, end_angle + 2 * np.pi, end_angle)
+    else:
+        end_angle = np.where(end_angle >= start_angle, end_angle - 2 * np.pi, end_angle)
+
+    sweep = end_angle - start_angle
+    num_points = (np.abs(sweep) / np.radians(degree_interval)).astype(np.int64) + 1
+    if tolerance is not None:
+        tolerance = np.broadcast_to(np.asarray(tolerance, dtype=np.float64), radius.shape)
+        fixed = np.isnan(tolerance)
+        step = chord_angle(radius, np.where(fixed, 1.0, tolerance))
+        segments = np.maximum(np.ceil(np.abs(sweep) / step), 1).astype(np.int64)
+        num_points = np.where(fixed, num_points, segments + 1)
+    angle_increment = sweep / (num_points - 1)
+
+    return _arc_vertices(cx, cy, radius, start_angle, angle_increment, num_points, elevation)
+
+
+def _arc_vertices(cx, cy, radius, start_angle, angle_increment, num_points, elevation):
+    arcs = PolygonArray.from_counts(None, num_points)
+    owner = np.repeat(np.arange(len(num_points)), num_points)
+    step = np.arange(arcs.offsets[-1]) - arcs.offsets[:-1][owner]
+    angle = start_angle[owner] + step * angle_increment[owner]
+
+    coords = np.empty((len(angle), 3), dtype=np.float64)
+    coords[:, 0] = cx[owner] + radius[owner] * np.cos(angle)
+    coords[:, 1] = cy[owner] + radius[owner] * np.sin(angle)
+    coords[:, 2] = np.broadcast_to(elevation, num_points.shape)[owner]
+    return PolygonArray(coords, arcs.offsets)
+
+
+def concat_parts(parts):
+    """
+    Join per-runway pieces into one polygon per runway.
+
+    Each part is either an (N, 3) array of single points or a PolygonArray of
+    N pieces; polygon i is part[0][i] + part[1][i] + ...
+    """
+    parts = [p if isinstance(p, PolygonArray) else PolygonArray.from_fixed(p[:, None, :])
+             for p in parts]
+    counts = np.stack([p.counts for p in parts])
+    polygons = PolygonArray.from_counts(None, counts.sum(axis=0))
+    part_start = np.cumsum(counts, axis=0) - counts
+
+    coords = np.empty((polygons.offsets[-1], 3), dtype=np.float64)
+    for i, part in enumerate(parts):
+        owner = np.repeat(np.arange(len(part)), part.counts)
+        step = np.arange(len(part.coords)) - part.offsets[:-1][owner]
+        coords[polygons.offsets[:-1][owner] + part_start[i][owner] + step] = part.coords
+    return PolygonArray(coords, polygons.offsets)
+
+
+def _area2_distances(runways):
+    w = runways.strip_width
+    d = (runways.strip_length - runways.runway_length) / 2
+    d1 = np.where(runways.clearway1 > d, runways.clearway1, d)
+    d2 = np.where(runways.clearway2 > d, runways.clearway2, d)
+    return w, d1, d2
+
+
+def area2a_batch(runways):
+    """Area 2a of N runways; PolygonArray of N polygons."""
+    w, d1, d2 = _area2_distances(runways)
+    az = runways.azimuth
+    end1, end2 = runways.end1, runways.end2
+
+    vertices = np.stack([
+        new_points(end1, w/2, az-90, 0, 0),
+        new_points(end1, d1, az, 0, -w/2/d1),
+        new_points(end1, d1, az, 0, w/2/d1),
+        new_points(end1, w/2, az+90, 0, 0),
+        new_points(end2, w/2, az-180-90, 0, 0),
+        new_points(end2, d2, az-180, 0, -w/2/d2),
+        new_points(end2, d2, az-180, 0, w/2/d2),
+        new_points(end2, w/2, az-180+90, 0, 0),
+    ], axis=1)
+    return PolygonArray.from_fixed(np.concatenate([vertices, vertices[:, :1]], axis=1))
+
+
+def _splay(origin, length, az_from, az_to, slope, direction, tolerance=None):
+    b1 = new_points(origin, length, az_from, slope, 0)
+    b2 = new_points(origin, length, az_to, slope, 0)
+    return arc_points(origin, b1, b2, b1[:, 2], direction, tolerance=tolerance)
+
+
+def area2b_batch(runways, l, s, div, tolerance=None):
+    """
+    Area 2b of N runways; tuple of two PolygonArray, one per runway end.
+
+    tolerance is the arc chord tolerance, see arc_points.
+    """
+    w, d1, d2 = _area2_distances(runways)
+    az = runways.azimuth
+    div_deg = np.degrees(np.arctan(div))
+
+    c11 = new_points(runways.end1, d1, az, 0, -w/2/d1)
+    c21 = new_points(runways.end1, d1, az, 0, w/2/d1)
+    coordinates1 = concat_parts([
+        c11,
+        _splay(c11, l, az-div_deg, az, s, "cw", tolerance),
+        _splay(c21, l, az, az+div_deg, s, "cw", tolerance),
+        c21,
+    ])
+
+    c12 = new_points(runways.end2, d2, az-180, 0, w/2/d2)
+    c22 = new_points(runways.end2, d2, az-180, 0, -w/2/d2)
+    coordinates2 = concat_parts([
+        c12,
+        _splay(c12, l, az-180+div_deg, az-180, s, "ccw", tolerance),
+        _splay(c22, l, az-180, az-180-div_deg, s, "ccw", tolerance),
+        c22,
+    ])
+
+    return coordinates1, coordinates2
+
+
+def area2c_batch(runways, l, s, div, tolerance=None):
+    """Area 2c of N runways; tuple of two PolygonArray, one per runway side."""
+    w, d1, d2 = _area2_distances(runways)
+    az = runways.azimuth
+    div_deg = np.degrees(np.arctan(div))
+
+    c11 = new_points(runways.end1, d1, az, 0, -w/2/d1)
+    c21 = new_points(runways.end2, d2, az-180, 0, w/2/d2)
+    coordinates1 = concat_parts([
+        c11,
+        _splay(c11, l, az-div_deg, az-90, s, "ccw", tolerance),
+        _splay(c21, l, az-180+90, az-180+div_deg, s, "ccw", tolerance),
+        c21,
+    ])
+
+    c12 = new_points(runways.end1, d1, az, 0, w/2/d1)
+    c22 = new_points(runways.end2, d2, az-180, 0, -w/2/d2)
+    coordinates2 = concat_parts([
+        c12,
+        _splay(c12, l, az+div_deg, az+90, s, "cw", tolerance),
+        _splay(c22, l, az-180-90, az-180-div_deg, s, "cw", tolerance),
+        c22,
+    ])
+
+    return coordinates1, coordinates2
+
+
+def area2d_batch(arp, radius, elev, resolution=360, tolerance=None):
+    """
+    Area 2d circles around N aerodrome reference points.
+
+    arp is (N, 2), elev a scalar or (N,) array. Returns a PolygonArray of N
+    open rings with ``resolution`` vertices each, or with as many as the
+    chord tolerance (see arc_points) requires.
+    """
+    n = len(arp)
+    counts = np.full(n, resolution, dtype=np.int64)
+    if tolerance is not None:
+        tolerance = np.broadcast_to(np.asarray(tolerance, dtype=np.float64), (n,))
+        fixed = np.isnan(tolerance)
+        step = chord_angle(radius, np.where(fixed, 1.0, tolerance))
+        counts = np.where(fixed, counts, np.maximum(np.ceil(2 * np.pi / step), 8).astype(np.int64))
+
+    rings = PolygonArray.from_counts(None, counts)
+    owner = np.repeat(np.arange(n), counts)
+    angle = 2 * np.pi * (np.arange(rings.offsets[-1]) - rings.offsets[:-1][owner]) / counts[owner]
+
+    coords = np.empty((len(angle), 3), dtype=np.float64)
+    coords[:, 0] = arp[owner, 0] + radius * np.cos(angle)
+    coords[:, 1] = arp[owner, 1] + radius * np.sin(angle)
+    coords[:, 2] = np.broadcast_to(elev, (n,))[owner]
+    return PolygonArray(coords, rings.offsets)
+
+
+def tfpa_batch(ends, clearway, azimuth_tfpa, w, l, w_f, s, div):
+    """
+    Take-off flight path areas from N runway ends.
+
+    ends is (N, 3), clearway and azimuth_tfpa (the take-off direction in
+    degrees) are (N,). The TFPA dimensions are scalars or (N,) arrays.
+    Returns a PolygonArray of N polygons.
+    """
+    d = np.where(clearway == 0, 0.001, clearway)
+
+    l1 = (w_f-w)/2/div
+    l2 = l-l1
+
+    #left side
+    a1 = new_points(ends, d, azimuth_tfpa, 0, -w/2/d)
+    a2 = new_points(a1, l1, azimuth_tfpa, s, -div)
+    a3 = new_points(a2, l2, azimuth_tfpa, s, 0)
+
+    #right side
+    a4 = new_points(ends, d, azimuth_tfpa, 0, w/2/d)
+    a5 = new_points(a4, l1, azimuth_tfpa, s, div)
+    a6 = new_points(a5, l2, azimuth_tfpa, s, 0)
+
+    return PolygonArray.from_fixed(np.stack([a1, a2, a3, a6, a5, a4, a1], axis=1))
@@ -0,0 +1,258 @@
+# Limiting Surfaces
+#
+# The eTOD areas and the take-off flight path areas as a footprint polygon
+# plus an analytic height, so a surface can be evaluated at any point instead
+# of only at its vertices. The footprints are the polygons the generators
+# write; the heights use the same parameters they are built with:
+#
+#   Area 2a  nearest runway elevation along the centre line + h_area2a
+#   Area 2b  runway end elevation + s_etod * distance from the inner edge,
+#            measured along the departure direction
+#   Area 2c  elevation of the nearest point of the Area 2a boundary
+#            + s_etod * distance from that boundary
+#   Area 2d  ref_elev + h_etod; only applies outside Areas 2a-2c
+#   TFPA     runway end elevation + slope * distance from the inner edge,
+#            measured along the take-off direction
+#
+# All coordinates are UTM in the zone of the aerodrome reference point.
+from dataclasses import dataclass
+
+import numpy as np
+
+from .geometry import sort_thresholds, DDMMSS_to_UTM
+from .projection import utm_epsg
+from .kernel import (
+    RunwayBatch,
+    _area2_distances,
+    area2a_batch,
+    area2b_batch,
+    area2c_batch,
+    area2d_batch,
+    new_points,
+    tfpa_batch,
+)
+from .etod import s_etod, l_etod, r_etod, h_etod, div_etod, h_area2a
+
+
+@dataclass
+class LimitingSurface:
+    """
+    One polygon of a limiting surface and the height of the surface over it.
+
+    The height is, depending on which fields are set:
+
+    - ``edges``: elevation of the nearest point on the edges + ``base``
+      + ``slope`` * distance to the edges
+    - ``direction``: ``base`` + ``slope`` * distance from ``origin`` along
+      ``direction`` (0 behind the origin)
+    - neither: ``base`` everywhere
+
+    Parameters
+    ----------
+    aerodrome : str
+        ICAO code of the aerodrome.
+    name : str
+        Surface name, as in the generated documents (e.g. "Area_2b_RWY16-34").
+    kind : str
+        "etod" or "tfpa".
+    polygon : ndarray
+        (n, 3) footprint vertices.
+    base, slope : float
+        See above.
+    origin, direction : ndarray, optional
+        (2,) point on the inner edge and unit vector of the rising direction.
+    edges : ndarray, optional
+        (k, 2, 3) segments the height is measured from.
+    fallback : bool
+        The surface only applies where no other surface of the same
+        aerodrome and kind does (Area 2d).
+    """
+    aerodrome: str
+    name: str
+    kind: str
+    polygon: np.ndarray
+    base: float = 0.0
+    slope: float = 0.0
+    origin: np.ndarray = None
+    direction: np.ndarray = None
+    edges: np.ndarray = None
+    fallback: bool = False
+
+    def height(self, x, y):
+        """Surface height at the points (x, y), as a float64 array."""
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        if self.edges is not None:
+            distance, elevation = nearest_on_segments(self.edges, x, y)
+            return elevation + self.base + self.slope * distance
+        if self.direction is not None:
+            along = (x - self.origin[0]) * self.direction[0] + (y - self.origin[1]) * self.direction[1]
+            return self.base + self.slope * np.maximum(along, 0)
+        return np.full(x.shape, float(self.base))
+
+
+def nearest_on_segments(edges, x, y):
+    """
+    Distance from every point to the nearest of a few 3D segments, and the
+    elevation of that nearest point.
+
+    Parameters
+    ----------
+    edges : ndarray
+        (k, 2, 3) segment end points.
+    x, y : ndarray
+        Point coordinates.
+
+    Returns
+    -------
+    tuple
+        Tuple of distance and elevation arrays, shaped like x.
+    """
+    distance = np.full(x.shape, np.inf)
+    elevation = np.zeros(x.shape)
+    # Loop over the (few) segments rather than the (many) points, keeping
+    # memory at a couple of arrays the size of x.
+    for (ax, ay, az), (bx, by, bz) in edges:
+        dx, dy = bx - ax, by - ay
+        length2 = dx * dx + dy * dy
+        if length2 > 0:
+            t = np.clip(((x - ax) * dx + (y - ay) * dy) / length2, 0, 1)
+        else:
+            t = np.zeros(x.shape)
+        d = np.hypot(x - ax - t * dx, y - ay - t * dy)
+        closer = d < distance
+        distance = np.where(closer, d, distance)
+        elevation = np.where(closer, az + t * (bz - az), elevation)
+    return distance, elevation
+
+
+def fallback_overrides(surfaces):
+    """
+    The surfaces that take precedence over each fallback surface (Area 2d):
+    a fallback surface only applies where no other surface of the same
+    aerodrome and kind does.
+
+    Parameters
+    ----------
+    surfaces : list
+        LimitingSurface.
+
+    Returns
+    -------
+    dict
+        Index of every fallback surface to the list of indices of the
+        surfaces overriding it.
+    """
+    return {
+        i: [j for j, other in enumerate(surfaces)
+            if not other.fallback and other.aerodrome == surface.aerodrome
+            and other.kind == surface.kind]
+        for i, surface in enumerate(surfaces) if surface.fallback
+    }
+
+
+def _unit(azimuth):
+    azimuth = np.radians(azimuth)
+    return np.array([np.sin(azimuth), np.cos(azimuth)])
+
+
+def _ring_edges(ring):
+    ring = np.asarray(ring, dtype=np.float64)
+    return np.stack([ring[:-1], ring[1:]], axis=1)
+
+
+def aerodrome_surfaces(aerodrome, epsg=None):
+    """
+    Build the limiting surfaces of every runway of an aerodrome: Area 2a-2c
+    per runway, one Area 2d and, if the aerodrome has TFPA parameters, the
+    TFPA of every runway end.
+
+    Parameters
+    ----------
+    aerodrome : Aerodrome
+        Aerodrome to build the surfaces for.
+    epsg : int, optional
+        UTM zone to build them in, defaults to the zone of the ARP.
+
+    Returns
+    -------
+    tuple
+        Tuple of the EPSG code and a list of LimitingSurface.
+    """
+    if epsg is None:
+        epsg = utm_epsg(aerodrome.arp_lat, aerodrome.arp_lon)
+    icao = aerodrome.icao
+
+    thresholds = [sort_thresholds(runway, epsg) for runway in aerodrome.runways]
+    surfaces = []
+
+    if thresholds:
+        runways = RunwayBatch.from_thresholds([
+            (t1, t2, azimuth, [runway.length, runway.width],
+             [runway.strip_length, runway.strip_width])
+            for (t1, t2, azimuth), runway in zip(thresholds, aerodrome.runways)
+        ])
+        w, d1, d2 = _area2_distances(runways)
+        az = runways.azimuth
+
+        area2a = area2a_batch(runways)
+        area2b = area2b_batch(runways, l_etod, s_etod, div_etod)
+        area2c = area2c_batch(runways, l_etod, s_etod, div_etod)
+        # Inner edges of Area 2b, at the runway end elevations
+        inner1 = new_points(runways.end1, d1, az, 0, -w/2/d1)
+        inner2 = new_points(runways.end2, d2, az-180, 0, w/2/d2)
+
+        for i, (t1, t2, azimuth) in enumerate(thresholds):
+            name = "_RWY" + t1[3] + "-" + t2[3]
+            centre_line = np.array([[runways.end1[i], runways.end2[i]]])
+            area2a_edges = _ring_edges(area2a[i])
+
+            surfaces.append(LimitingSurface(
+                icao, "Area_2a" + name, "etod", area2a[i],
+                base=h_area2a, edges=centre_line))
+            surfaces += [
+                LimitingSurface(icao, "Area_2b" + name, "etod", area2b[0][i],
+                                base=t1[6], slope=s_etod, origin=inner1[i, :2],
+                                direction=_unit(azimuth)),
+                LimitingSurface(icao, "Area_2b" + name, "etod", area2b[1][i],
+                                base=t2[6], slope=s_etod, origin=inner2[i, :2],
+                                direction=_unit(azimuth - 180)),
+            ]
+            surfaces += [
+                LimitingSurface(icao, "Area_2c" + name, "etod", side[i],
+                                slope=s_etod, edges=area2a_edges)
+                for side in area2c
+            ]
+
+    _, arp_x, arp_y = DDMMSS_to_UTM(aerodrome.arp_lat, aerodrome.arp_lon, epsg)
+    area2d = area2d_batch(np.array([[arp_x, arp_y]]), r_etod, float(aerodrome.ref_elev) + h_etod)
+    surfaces.append(LimitingSurface(
+        icao, "Area_2d", "etod", area2d[0],
+        base=float(aerodrome.ref_elev) + h_etod, fallback=True))
+
+    if aerodrome.tfpa is not None and thresholds:
+        surfaces += _tfpa_surfaces(icao, thresholds, aerodrome.tfpa)
+
+    return epsg, surfaces
+
+
+def _tfpa_surfaces(icao, thresholds, params):
+    ends = [t for t1, t2, _ in thresholds for t in (t1, t2)]
+    # Take-off direction, as in tfpa()
+    azimuth_tfpa = np.array([azimuth if t[-1] < 0 else azimuth - 180
+                             for t1, t2, azimuth in thresholds for t in (t1, t2)])
+    end_points = np.array([t[4:7] for t in ends], dtype=np.float64)
+    clearway = np.array([t[7] for t in ends], dtype=np.float64)
+
+    polygons = tfpa_batch(end_points, clearway, azimuth_tfpa, params.inner_width,
+                          params.length, params.final_width, params.slope,
+                          params.divergence)
+    d = np.where(clearway == 0, 0.001, clearway)
+    inner = new_points(end_points, d, azimuth_tfpa, 0, -params.inner_width/2/d)
+
+    return [
+        LimitingSurface(icao, "TFPA_RWY" + t[3], "tfpa", polygons[i],
+                        base=t[6], slope=params.slope, origin=inner[i, :2],
+                        direction=_unit(azimuth_tfpa[i]))
+        for i, t in enumerate(ends)
+    ]
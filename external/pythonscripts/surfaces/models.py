@@ -0,0 +1,111 @@
+from dataclasses import dataclass, field, fields
+from typing import List, Optional
+
+
+@dataclass
+class RunwayEnd:
+    """
+    One end of a runway.
+
+    Coordinates are given in DDMMSS.SS format, as in the AIP.
+
+    Parameters
+    ----------
+    designator : str
+        Runway designator of this end, e.g. "16".
+    threshold_lat, threshold_lon : str
+        Threshold coordinates.
+    threshold_elev : float
+        Threshold elevation.
+    end_lat, end_lon : str
+        Coordinates of the runway end the strip and Area 2 start from.
+    end_elev : float
+        Elevation of the runway end.
+    clearway : float
+        Length of the clearway beyond this end.
+    """
+    designator: str
+    threshold_lat: str
+    threshold_lon: str
+    threshold_elev: float
+    end_lat: str
+    end_lon: str
+    end_elev: float
+    clearway: float = 0.0
+
+
+@dataclass
+class Runway:
+    """
+    A runway with both of its ends and its strip.
+
+    Length, width and strip dimensions are only needed for the eTOD areas,
+    the TFPA surfaces are built from the runway ends alone.
+    """
+    end1: RunwayEnd
+    end2: RunwayEnd
+    length: float = 0
+    width: float = 0
+    strip_length: float = 0
+    strip_width: float = 0
+
+    @property
+    def name(self):
+        return self.end1.designator + "-" + self.end2.designator
+
+    @classmethod
+    def from_dict(cls, data):
+        values = dict(data)
+        values["end1"] = RunwayEnd(**values["end1"])
+        values["end2"] = RunwayEnd(**values["end2"])
+        return cls(**values)
+
+
+@dataclass
+class TFPAParameters:
+    """
+    Annex 4 take-off flight path area parameters.
+
+    Parameters
+    ----------
+    length : float
+        Length of the TFPA surface.
+    inner_width : float
+        Length of the inner edge.
+    divergence : float
+        Divergence of each side.
+    final_width : float
+        Width of the take-off surface at the end of the splay.
+    slope : float
+        Slope of the take-off surface.
+    """
+    length: float
+    inner_width: float
+    divergence: float
+    final_width: float
+    slope: float
+
+
+@dataclass
+class Aerodrome:
+    """
+    An aerodrome with its reference point and runways.
+
+    ``tfpa`` is optional; when given, the batch job also generates the TFPA
+    surfaces for every runway of the aerodrome.
+    """
+    icao: str
+    arp_lat: str
+    arp_lon: str
+    ref_elev: float
+    runways: List[Runway] = field(default_factory=list)
+    tfpa: Optional[TFPAParameters] = None
+
+    @classmethod
+    def from_dict(cls, data):
+        names = {f.name for f in fields(cls)}
+        values = {key: value for key, value in data.items() if key in names}
+        values["runways"] = [Runway.from_dict(r) for r in data.get("runways", [])]
+        if data.get("tfpa") is not None:
+            values["tfpa"] = TFPAParameters(**data["tfpa"])
+        return cls(**values)
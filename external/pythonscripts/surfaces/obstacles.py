@@ -0,0 +1,288 @@
+# Obstacle Penetration Analysis
+#
+# Checks surveyed obstacles against the limiting surfaces of surfaces.limits
+# (eTOD Area 2a-2d and, where an aerodrome has TFPA parameters, the TFPA) and
+# writes every obstacle that penetrates a surface, with the penetration depth,
+# as CSV.
+#
+# Usage:
+#   python -m surfaces.obstacles aerodromes.json obstacles.npy [--geographic]
+#       [--output penetrations.csv] [--chunk-size N] [--cell-size M]
+#
+# The aerodromes file is the batch input (see surfaces.batch). Obstacles are
+# (x, y, height) rows, either
+#
+#   .npy         an (N, 3) array, memory-mapped
+#   .csv / .txt  comma separated, first three columns, optional header line
+#   other        raw native-endian float64 (or --dtype) triplets, memory-mapped
+#
+# x, y are UTM in the zone of the aerodromes, or longitude and latitude in
+# decimal degrees with --geographic. The file is processed in chunks, so
+# memory use does not grow with its size.
+#
+# Output columns: obstacle (0 based row), x, y, height (as read), aerodrome,
+# surface, surface_height, penetration.
+from itertools import islice
+import argparse
+import time
+import sys
+
+import numpy as np
+import shapely
+
+from .batch import load_aerodromes
+from .limits import aerodrome_surfaces, fallback_overrides
+from .projection import utm_transformer
+
+DEFAULT_CHUNK_SIZE = 1_000_000
+DEFAULT_CELL_SIZE = 2000.0
+
+CSV_HEADER = "obstacle,x,y,height,aerodrome,surface,surface_height,penetration\n"
+
+
+def open_obstacles(path, dtype="float64"):
+    """
+    Memory-map a binary obstacle file, see the module header.
+
+    Returns
+    -------
+    ndarray
+        (N, 3) or wider read-only array of x, y, height rows.
+    """
+    if path.lower().endswith(".npy"):
+        data = np.load(path, mmap_mode="r")
+    else:
+        data = np.memmap(path, dtype=dtype, mode="r")
+        if len(data) % 3:
+            raise ValueError(path + " does not hold whole (x, y, height) records")
+        data = data.reshape(-1, 3)
+    if data.ndim != 2 or data.shape[1] < 3:
+        raise ValueError(path + " is not an array of (x, y, height) rows")
+    return data
+
+
+def _iter_csv(path, chunk_size):
+    with open(path, "r") as f:
+        first = f.readline()
+        try:
+            float(first.split(",")[0])
+            pending = [first]
+        except ValueError:
+            pending = []
+
+        start = 0
+        while True:
+            lines = pending + list(islice(f, chunk_size - len(pending)))
+            pending = []
+            lines = [line for line in lines if line.strip()]
+            if not lines:
+                break
+            chunk = np.loadtxt(lines, delimiter=",", usecols=(0, 1, 2), ndmin=2, dtype=np.float64)
+            yield start, chunk
+            start += len(chunk)
+
+
+def iter_obstacles(path, chunk_size=DEFAULT_CHUNK_SIZE, dtype="float64"):
+    """Yield (first row, (n, 3) float64 array) chunks of an obstacle file."""
+    if path.lower().endswith((".csv", ".txt")):
+        yield from _iter_csv(path, chunk_size)
+        return
+
+    data = open_obstacles(path, dtype)
+    for start in range(0, len(data), chunk_size):
+        yield start, np.asarray(data[start:start + chunk_size, :3], dtype=np.float64)
+
+
+def _gather(values, start, end):
+    """Concatenate values[start[k]:end[k]] for all k."""
+    counts = end - start
+    total = counts.sum()
+    if not total:
+        return values[:0]
+    shift = np.repeat(start - (np.cumsum(counts) - counts), counts)
+    return values[np.arange(total) + shift]
+
+
+class SurfaceIndex:
+    """
+    Uniform grid over the footprints of a set of limiting surfaces.
+
+    Every surface is registered in the grid cells its footprint touches.
+    Points in a cell the footprint covers completely are inside without
+    further tests; only points in cells on the footprint boundary go
+    through an exact point-in-polygon test.
+
+    Parameters
+    ----------
+    surfaces : list
+        LimitingSurface, all in the same UTM zone.
+    cell_size : float
+        Grid cell size in metres.
+    """
+
+    def __init__(self, surfaces, cell_size=DEFAULT_CELL_SIZE):
+        self.surfaces = surfaces
+        self.cell_size = cell_size
+        self.polygons = np.array([shapely.Polygon(s.polygon[:, :2]) for s in surfaces])
+        shapely.prepare(self.polygons)
+
+        bounds = shapely.bounds(self.polygons)
+        self.origin = bounds[:, :2].min(axis=0)
+        self.shape = (np.floor((bounds[:, 2:].max(axis=0) - self.origin) / cell_size)
+                      .astype(np.int64) + 1)
+
+        self.cells = [self._cells(polygon, b) for polygon, b in zip(self.polygons, bounds)]
+
+        self.overrides = fallback_overrides(surfaces)
+
+    def _cells(self, polygon, bounds):
+        """Keys of the cells touching polygon and whether it covers them."""
+        low = np.floor((bounds[:2] - self.origin) / self.cell_size).astype(np.int64)
+        high = np.floor((bounds[2:] - self.origin) / self.cell_size).astype(np.int64)
+        i, j = np.meshgrid(np.arange(low[0], high[0] + 1), np.arange(low[1], high[1] + 1),
+                           indexing="ij")
+        i, j = i.ravel(), j.ravel()
+
+        x0 = self.origin[0] + i * self.cell_size
+        y0 = self.origin[1] + j * self.cell_size
+        boxes = shapely.box(x0, y0, x0 + self.cell_size, y0 + self.cell_size)
+        touching = shapely.intersects(polygon, boxes)
+        covered = shapely.covers(polygon, boxes[touching])
+        return (i * self.shape[1] + j)[touching], covered
+
+    def locate(self, x, y):
+        """
+        Find the points inside every surface.
+
+        Returns
+        -------
+        list
+            For every surface, the sorted indices of the points in its
+            footprint (boundary included). Fallback surfaces exclude the
+            points inside the surfaces that override them.
+        """
+        i = np.floor((x - self.origin[0]) / self.cell_size)
+        j = np.floor((y - self.origin[1]) / self.cell_size)
+        points = np.flatnonzero((i >= 0) & (i < self.shape[0]) & (j >= 0) & (j < self.shape[1]))
+        keys = i[points].astype(np.int64) * self.shape[1] + j[points].astype(np.int64)
+
+        order = np.argsort(keys, kind="stable")
+        keys, points = keys[order], points[order]
+
+        located = []
+        for polygon, (cells, covered) in zip(self.polygons, self.cells):
+            start = np.searchsorted(keys, cells, "left")
+            end = np.searchsorted(keys, cells, "right")
+            inside = _gather(points, start[covered], end[covered])
+            boundary = _gather(points, start[~covered], end[~covered])
+            boundary = boundary[shapely.intersects_xy(polygon, x[boundary], y[boundary])]
+            hits = np.concatenate([inside, boundary])
+            hits.sort()
+            located.append(hits)
+
+        for i, overrides in self.overrides.items():
+            excluded = np.zeros(len(x), dtype=bool)
+            for j in overrides:
+                excluded[located[j]] = True
+            located[i] = located[i][~excluded[located[i]]]
+        return located
+
+    def penetrations(self, x, y, height):
+        """
+        Yield (surface, point indices, surface height, penetration) for every
+        surface some of the points penetrate, i.e. are higher than.
+        """
+        for surface, hits in zip(self.surfaces, self.locate(x, y)):
+            if not len(hits):
+                continue
+            surface_height = surface.height(x[hits], y[hits])
+            penetration = height[hits] - surface_height
+            above = penetration > 0
+            if above.any():
+                yield surface, hits[above], surface_height[above], penetration[above]
+
+
+def _write_rows(stream, surface, values, block=50_000):
+    # One % operation per block of rows; formatting row by row (np.savetxt)
+    # takes longer than the whole analysis.
+    line = ("%d,%.10g,%.10g,%.3f," + surface.aerodrome.replace("%", "%%") + ","
+            + surface.name.replace("%", "%%") + ",%.3f,%.3f\n")
+    for i in range(0, len(values), block):
+        part = values[i:i + block]
+        stream.write((line * len(part)) % tuple(part.ravel().tolist()))
+
+
+def zone_indexes(aerodromes, cell_size=DEFAULT_CELL_SIZE):
+    """One SurfaceIndex per UTM zone, over the surfaces of all aerodromes in it."""
+    zones = {}
+    for aerodrome in aerodromes:
+        epsg, surfaces = aerodrome_surfaces(aerodrome)
+        zones.setdefault(epsg, []).extend(surfaces)
+    return {epsg: SurfaceIndex(surfaces, cell_size) for epsg, surfaces in zones.items()}
+
+
+def analyze(aerodromes, path, stream, geographic=False, chunk_size=DEFAULT_CHUNK_SIZE,
+            cell_size=DEFAULT_CELL_SIZE, dtype="float64"):
+    """
+    Write the obstacles of path that penetrate a limiting surface of the
+    aerodromes to stream as CSV, flushing after every chunk.
+
+    Returns
+    -------
+    tuple
+        Tuple of the number of obstacles read and the number of rows written.
+    """
+    indexes = zone_indexes(aerodromes, cell_size)
+    if not geographic and len(indexes) > 1:
+        raise ValueError("The aerodromes span several UTM zones (EPSG "
+                         + ", ".join(map(str, sorted(indexes)))
+                         + "); give the obstacles in geographic coordinates")
+
+    stream.write(CSV_HEADER)
+    obstacles = rows = 0
+    for start, chunk in iter_obstacles(path, chunk_size, dtype):
+        for epsg, index in indexes.items():
+            if geographic:
+                x, y = utm_transformer(epsg).transform(chunk[:, 0], chunk[:, 1])
+            else:
+                x, y = chunk[:, 0], chunk[:, 1]
+
+            for surface, hits, surface_height, penetration in index.penetrations(x, y, chunk[:, 2]):
+                _write_rows(stream, surface, np.column_stack([
+                    hits + start, chunk[hits], surface_height, penetration]))
+                rows += len(hits)
+        obstacles += len(chunk)
+        stream.flush()
+    return obstacles, rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find obstacles penetrating the eTOD and TFPA surfaces.")
+    parser.add_argument("aerodromes", help="JSON or JSON-lines file of aerodromes")
+    parser.add_argument("obstacles", help=".npy, .csv or raw binary file of (x, y, height) rows")
+    parser.add_argument("--output", help="CSV file to write to (default: standard output)")
+    parser.add_argument("--geographic", action="store_true",
+                        help="x, y are longitude and latitude in decimal degrees")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="obstacles processed at a time")
+    parser.add_argument("--cell-size", type=float, default=DEFAULT_CELL_SIZE,
+                        help="grid cell size of the surface index in metres")
+    parser.add_argument("--dtype", default="float64", help="value type of raw binary files")
+    args = parser.parse_args(argv)
+
+    aerodromes = load_aerodromes(args.aerodromes)
+    started = time.perf_counter()
+    stream = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        obstacles, rows = analyze(aerodromes, args.obstacles, stream, args.geographic,
+                                  args.chunk_size, args.cell_size, args.dtype)
+    finally:
+        if args.output:
+            stream.close()
+
+    print("%d obstacles, %d penetrations in %.2f s"
+          % (obstacles, rows, time.perf_counter() - started), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# Coordinate Transformations
+#
+# Transformer objects are expensive to build, so there is one cached pair
+# (geographic -> UTM and back) per UTM zone. All transforms take whole
+# coordinate arrays.
+from functools import lru_cache
+
+import numpy as np
+import pyproj
+
+WGS84 = 4326
+
+
+@lru_cache(maxsize=None)
+def utm_transformer(epsg):
+    """Cached WGS 84 (lon, lat) -> UTM (easting, northing) transformer."""
+    return pyproj.Transformer.from_crs(WGS84, epsg, always_xy=True)
+
+
+@lru_cache(maxsize=None)
+def geographic_transformer(epsg):
+    """Cached UTM (easting, northing) -> WGS 84 (lon, lat) transformer."""
+    return pyproj.Transformer.from_crs(epsg, WGS84, always_xy=True)
+
+
+def DDMMSS_to_decimal(value):
+    """
+    Convert DDMMSS.SS values to decimal degrees.
+
+    Accepts a single value or an array of them (numbers or numeric strings)
+    and returns a float or float64 array accordingly.
+    """
+    value = np.asarray(value, dtype=np.float64)
+    degrees = np.trunc(value / 10000)
+    minutes = np.trunc((value - degrees * 10000) / 100)
+    seconds = value - degrees * 10000 - minutes * 100
+    decimal = degrees + (minutes / 60) + (seconds / 3600)
+    return decimal if decimal.ndim else float(decimal)
+
+
+def utm_epsg(lat, lon):
+    """EPSG code of the WGS 84 / UTM north zone containing a DDMMSS point."""
+    utm_zone = int((DDMMSS_to_decimal(lon) + 180) / 6) + 1
+    return 32600 + utm_zone
+
+
+def to_utm(lat, lon, epsg):
+    """
+    Project DDMMSS.SS coordinates to UTM.
+
+    Parameters
+    ----------
+    lat, lon : array_like
+        Latitudes and longitudes in DDMMSS.SS format.
+    epsg : int
+        EPSG code of the target UTM zone.
+
+    Returns
+    -------
+    tuple
+        Tuple of easting and northing arrays.
+    """
+    return utm_transformer(epsg).transform(DDMMSS_to_decimal(lon), DDMMSS_to_decimal(lat))
+
+
+def to_geographic(coords, epsg):
+    """
+    Convert an (N, 2) or (N, 3) array of UTM vertices to WGS 84.
+
+    Returns a new array of the same shape with x, y replaced by longitude and
+    latitude; elevations are kept.
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    geographic = coords.copy()
+    geographic[:, 0], geographic[:, 1] = geographic_transformer(epsg).transform(coords[:, 0], coords[:, 1])
+    return geographic
+
+
+def surfaces_to_geographic(surfaces, epsg):
+    """
+    Convert every polygon of a surfaces dict to WGS 84 with one transform.
+
+    Parameters
+    ----------
+    surfaces : dict
+        Mapping of surface name to list of polygons, each a sequence of
+        (x, y, z) vertices in ``epsg``.
+    epsg : int
+        EPSG code of the UTM zone the vertices are in.
+
+    Returns
+    -------
+    dict
+        The same mapping with every polygon as an (n, 3) array of
+        (lon, lat, z).
+    """
+    polygons = [np.asarray(polygon, dtype=np.float64)
+                for coordinates in surfaces.values() for polygon in coordinates]
+    if not polygons:
+        return {name: [] for name in surfaces}
+
+    geographic = to_geographic(np.concatenate(polygons), epsg)
+    offsets = np.cumsum([0] + [len(polygon) for polygon in polygons])
+
+    result = {}
+    i = 0
+    for name, coordinates in surfaces.items():
+        result[name] = [geographic[offsets[i + j]:offsets[i + j + 1]] for j in range(len(coordinates))]
+        i += len(coordinates)
+    return result
@@ -0,0 +1,393 @@
+# Limiting Surface Rasters
+#
+# Rasterizes the lowest limiting surface of surfaces.limits (eTOD Area 2a-2d
+# and, where an aerodrome has TFPA parameters, the TFPA) onto a regular UTM
+# grid, so it can be compared with a DEM by plain array subtraction.
+#
+# Usage:
+#   python -m surfaces.raster aerodromes.json output.npy --resolution 1
+#       [--icao LWSK] [--epsg 32634] [--bounds XMIN YMIN XMAX YMAX]
+#       [--tile-size 1024] [--no-tfpa]
+#
+# The aerodromes file is the batch input (see surfaces.batch). The output is
+# a float32 array with one row per grid row, north first; cells outside
+# every surface are NaN. The file is filled with NaN first and then written
+# tile by tile, so cells an interrupted run did not reach are NaN too, and
+# memory use depends on the tile size only, not on the size of the grid:
+#
+#   .npy   NumPy array file
+#   other  raw little-endian float32 with an ENVI header (.hdr), which GDAL
+#          and most GIS tools open directly
+#
+# Both come with a JSON sidecar (output + ".json") holding the EPSG code,
+# the GDAL style geotransform and the grid size. Cell values are the surface
+# heights at the cell centres.
+from dataclasses import dataclass, asdict
+import argparse
+import time
+import json
+import math
+import sys
+import os
+
+import numpy as np
+import shapely
+
+from .batch import load_aerodromes
+from .limits import aerodrome_surfaces, fallback_overrides
+from .projection import utm_epsg
+
+DEFAULT_TILE_SIZE = 1024
+# Below this many cells a block on a footprint boundary is tested cell by cell
+DEFAULT_BLOCK_SIZE = 64
+# Cells written at a time when filling a new raster with NaN (16 MB)
+FILL_CHUNK_CELLS = 4 * 2**20
+
+
+@dataclass
+class RasterGrid:
+    """
+    A north-up grid of square cells.
+
+    Parameters
+    ----------
+    epsg : int
+        EPSG code of the UTM zone.
+    x_min, y_max : float
+        Top left (north west) corner.
+    resolution : float
+        Cell size in metres.
+    rows, cols : int
+        Grid size.
+    """
+    epsg: int
+    x_min: float
+    y_max: float
+    resolution: float
+    rows: int
+    cols: int
+
+    @classmethod
+    def from_bounds(cls, epsg, bounds, resolution):
+        """Smallest grid covering (x_min, y_min, x_max, y_max) whose cell
+        edges lie on multiples of resolution, so grids of the same
+        resolution line up with each other and with DEMs."""
+        x_min, y_min, x_max, y_max = bounds
+        x_min = math.floor(x_min / resolution) * resolution
+        y_min = math.floor(y_min / resolution) * resolution
+        x_max = math.ceil(x_max / resolution) * resolution
+        y_max = math.ceil(y_max / resolution) * resolution
+        return cls(epsg, x_min, y_max, resolution,
+                   max(int(round((y_max - y_min) / resolution)), 1),
+                   max(int(round((x_max - x_min) / resolution)), 1))
+
+    @property
+    def transform(self):
+        """GDAL geotransform of the grid."""
+        return (self.x_min, self.resolution, 0.0, self.y_max, 0.0, -self.resolution)
+
+    def x(self, start, stop):
+        """Easting of the centres of columns start to stop."""
+        return self.x_min + (np.arange(start, stop) + 0.5) * self.resolution
+
+    def y(self, start, stop):
+        """Northing of the centres of rows start to stop."""
+        return self.y_max - (np.arange(start, stop) + 0.5) * self.resolution
+
+
+def footprint_mask(polygon, x, y, block=DEFAULT_BLOCK_SIZE):
+    """
+    Which of the grid points (x, y) lie in polygon (boundary included).
+
+    The block is split into quarters until each part is either covered by
+    the polygon, disjoint from it or small enough to test point by point,
+    so only points near the boundary go through a point-in-polygon test.
+
+    Parameters
+    ----------
+    polygon : shapely.Polygon
+        Footprint, preferably prepared.
+    x : ndarray
+        Increasing column coordinates.
+    y : ndarray
+        Decreasing row coordinates.
+    block : int
+        Size of the blocks tested point by point.
+
+    Returns
+    -------
+    None, True or ndarray
+        None if no point is inside, True if all are, otherwise a
+        (len(y), len(x)) boolean mask.
+    """
+    if len(x) < 2 or len(y) < 2 or len(x) * len(y) <= block * block:
+        mask = shapely.intersects_xy(polygon, x[np.newaxis, :], y[:, np.newaxis])
+        if not mask.any():
+            return None
+        return True if mask.all() else mask
+
+    box = shapely.box(x[0], y[-1], x[-1], y[0])
+    if not shapely.intersects(polygon, box):
+        return None
+    if shapely.covers(polygon, box):
+        return True
+
+    mask = np.zeros((len(y), len(x)), dtype=bool)
+    rows, cols = (len(y) + 1) // 2, (len(x) + 1) // 2
+    for i in (slice(0, rows), slice(rows, None)):
+        for j in (slice(0, cols), slice(cols, None)):
+            part = footprint_mask(polygon, x[j], y[i], block)
+            if part is not None:
+                mask[i, j] = part
+    return mask
+
+
+class SurfaceRasterizer:
+    """
+    Evaluates the lowest of a set of limiting surfaces on grid tiles.
+
+    Fallback surfaces (Area 2d) only count where no other surface of the
+    same aerodrome and kind does (see limits.fallback_overrides).
+
+    Parameters
+    ----------
+    surfaces : list
+        LimitingSurface, all in the UTM zone of the grid.
+    block : int
+        See footprint_mask.
+    """
+
+    def __init__(self, surfaces, block=DEFAULT_BLOCK_SIZE):
+        self.surfaces = surfaces
+        self.block = block
+        self.polygons = np.array([shapely.Polygon(s.polygon[:, :2]) for s in surfaces])
+        shapely.prepare(self.polygons)
+        self.bounds = shapely.bounds(self.polygons)
+
+        self.overrides = fallback_overrides(surfaces)
+
+    def _masks(self, x, y):
+        """footprint_mask of every surface over the tile, None ones left out."""
+        near = np.flatnonzero((self.bounds[:, 0] <= x[-1]) & (self.bounds[:, 2] >= x[0])
+                              & (self.bounds[:, 1] <= y[0]) & (self.bounds[:, 3] >= y[-1]))
+        masks = {}
+        for i in near:
+            mask = footprint_mask(self.polygons[i], x, y, self.block)
+            if mask is not None:
+                masks[i] = mask
+        return masks
+
+    def tile(self, x, y):
+        """
+        Lowest surface height at the grid points (x, y).
+
+        Parameters
+        ----------
+        x : ndarray
+            Increasing column coordinates.
+        y : ndarray
+            Decreasing row coordinates.
+
+        Returns
+        -------
+        ndarray
+            (len(y), len(x)) float64 heights, NaN outside every surface.
+        """
+        shape = (len(y), len(x))
+        masks = self._masks(x, y)
+
+        for i, overrides in self.overrides.items():
+            if i not in masks:
+                continue
+            excluded = np.zeros(shape, dtype=bool)
+            for j in overrides:
+                if masks.get(j) is True:
+                    excluded[:] = True
+                    break
+                if j in masks:
+                    excluded |= masks[j]
+            if excluded.all():
+                del masks[i]
+            elif excluded.any():
+                masks[i] = ~excluded if masks[i] is True else masks[i] & ~excluded
+
+        lowest = np.full(shape, np.nan)
+        if not masks:
+            return lowest
+        xx, yy = np.broadcast_arrays(x[np.newaxis, :], y[:, np.newaxis])
+        for i, mask in masks.items():
+            surface = self.surfaces[i]
+            if mask is True:
+                np.fmin(lowest, surface.height(xx, yy), out=lowest)
+            else:
+                lowest[mask] = np.fmin(lowest[mask], surface.height(xx[mask], yy[mask]))
+        return lowest
+
+
+def iter_tiles(surfaces, grid, tile_size=DEFAULT_TILE_SIZE, block=DEFAULT_BLOCK_SIZE):
+    """
+    Yield (first row, first column, float32 heights) tiles of the lowest
+    height of the surfaces on grid, row of tiles by row of tiles.
+
+    Parameters
+    ----------
+    surfaces : list
+        LimitingSurface, in the UTM zone of the grid.
+    grid : RasterGrid
+        Grid to evaluate the surfaces on.
+    tile_size : int
+        Rows and columns computed at a time. Memory use is a few float64
+        arrays of tile_size**2 values.
+    block : int
+        See footprint_mask.
+    """
+    rasterizer = SurfaceRasterizer(surfaces, block)
+    for row in range(0, grid.rows, tile_size):
+        y = grid.y(row, min(row + tile_size, grid.rows))
+        for col in range(0, grid.cols, tile_size):
+            x = grid.x(col, min(col + tile_size, grid.cols))
+            yield row, col, rasterizer.tile(x, y).astype(np.float32)
+
+
+def rasterize(surfaces, grid, tile_size=DEFAULT_TILE_SIZE, block=DEFAULT_BLOCK_SIZE):
+    """Lowest height of the surfaces on grid as an in-memory (rows, cols)
+    float32 array, see iter_tiles."""
+    out = np.empty((grid.rows, grid.cols), dtype=np.float32)
+    for row, col, tile in iter_tiles(surfaces, grid, tile_size, block):
+        out[row:row + tile.shape[0], col:col + tile.shape[1]] = tile
+    return out
+
+
+def _envi_header(grid):
+    zone = grid.epsg % 100
+    hemisphere = "North" if grid.epsg // 100 == 326 else "South"
+    return ("ENVI\n"
+            "description = {Lowest limiting surface height}\n"
+            "samples = %d\n"
+            "lines = %d\n"
+            "bands = 1\n"
+            "header offset = 0\n"
+            "file type = ENVI Standard\n"
+            "data type = 4\n"
+            "interleave = bsq\n"
+            "byte order = 0\n"
+            "map info = {UTM, 1, 1, %r, %r, %r, %r, %d, %s, WGS-84, units=Meters}\n"
+            "band names = {height}\n"
+            % (grid.cols, grid.rows, grid.x_min, grid.y_max, grid.resolution,
+               grid.resolution, zone, hemisphere))
+
+
+def _fill_nan(path, offset, cells, chunk=FILL_CHUNK_CELLS):
+    """Write cells float32 NaNs to path from offset on, chunk cells at a time."""
+    block = np.full(min(cells, chunk), np.nan, dtype="<f4")
+    with open(path, "r+b") as f:
+        f.seek(offset)
+        while cells > 0:
+            count = min(cells, len(block))
+            f.write(block[:count])
+            cells -= count
+
+
+def create_raster(path, grid):
+    """
+    Create the (NaN filled) output file of a grid and its sidecar files, see
+    the module header.
+
+    Returns
+    -------
+    int
+        Byte offset of the first cell in the file.
+    """
+    shape = (grid.rows, grid.cols)
+    if path.lower().endswith(".npy"):
+        out = np.lib.format.open_memmap(path, mode="w+", dtype="<f4", shape=shape)
+        offset = out.offset
+        del out
+    else:
+        open(path, "wb").close()
+        with open(os.path.splitext(path)[0] + ".hdr", "w") as f:
+            f.write(_envi_header(grid))
+        offset = 0
+
+    # Cells not written yet (e.g. after an interrupted run) must read as
+    # NaN rather than as a 0 m surface, so fill the whole file up front.
+    _fill_nan(path, offset, grid.rows * grid.cols)
+
+    with open(path + ".json", "w") as f:
+        json.dump(dict(asdict(grid), transform=grid.transform, nodata="NaN"), f, indent=2)
+    return offset
+
+
+def write_raster(surfaces, grid, path, tile_size=DEFAULT_TILE_SIZE, block=DEFAULT_BLOCK_SIZE):
+    """
+    Rasterize the lowest height of the surfaces on grid to a .npy or raw
+    float32 file, see the module header.
+
+    Every tile is written to its place in the file as soon as it is done
+    (rather than through a memory map of the whole file), so memory use
+    stays at a few tiles however large the grid is.
+    """
+    offset = create_raster(path, grid)
+    row_bytes = grid.cols * 4
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        for row, col, tile in iter_tiles(surfaces, grid, tile_size, block):
+            tile = tile.astype("<f4", copy=False)
+            for i, values in enumerate(tile, row):
+                os.pwrite(fd, values, offset + i * row_bytes + col * 4)
+    finally:
+        os.close(fd)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rasterize the lowest eTOD/TFPA surface height.")
+    parser.add_argument("aerodromes", help="JSON or JSON-lines file of aerodromes")
+    parser.add_argument("output", help=".npy or raw float32 output file")
+    parser.add_argument("--resolution", type=float, default=1.0, help="cell size in metres")
+    parser.add_argument("--icao", help="comma separated aerodromes to include (default: all)")
+    parser.add_argument("--epsg", type=int,
+                        help="UTM zone of the grid (default: zone of the first aerodrome)")
+    parser.add_argument("--bounds", type=float, nargs=4, metavar=("XMIN", "YMIN", "XMAX", "YMAX"),
+                        help="grid extent in UTM (default: all surfaces)")
+    parser.add_argument("--tile-size", type=int, default=DEFAULT_TILE_SIZE,
+                        help="rows and columns computed at a time")
+    parser.add_argument("--no-tfpa", action="store_true", help="leave out the TFPA surfaces")
+    args = parser.parse_args(argv)
+
+    if args.resolution <= 0:
+        parser.error("--resolution must be positive")
+
+    aerodromes = load_aerodromes(args.aerodromes)
+    if args.icao:
+        wanted = args.icao.split(",")
+        aerodromes = [a for a in aerodromes if a.icao in wanted]
+    if not aerodromes:
+        parser.error("no aerodromes to rasterize")
+
+    zones = sorted({utm_epsg(a.arp_lat, a.arp_lon) for a in aerodromes})
+    if args.epsg is None and len(zones) > 1:
+        parser.error("the aerodromes span several UTM zones (EPSG "
+                     + ", ".join(map(str, zones)) + "); select them with --icao or give --epsg")
+    epsg = args.epsg or zones[0]
+
+    surfaces = []
+    for aerodrome in aerodromes:
+        _, built = aerodrome_surfaces(aerodrome, epsg)
+        surfaces += [s for s in built if not (args.no_tfpa and s.kind == "tfpa")]
+
+    if args.bounds:
+        bounds = args.bounds
+    else:
+        vertices = np.concatenate([s.polygon[:, :2] for s in surfaces])
+        bounds = (*vertices.min(axis=0), *vertices.max(axis=0))
+    grid = RasterGrid.from_bounds(epsg, bounds, args.resolution)
+
+    started = time.perf_counter()
+    write_raster(surfaces, grid, args.output, args.tile_size)
+
+    print("%d x %d cells (EPSG:%d) in %.2f s"
+          % (grid.rows, grid.cols, epsg, time.perf_counter() - started), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# Surface Serializers
+#
+# Write surfaces straight from coordinate arrays to a text stream as one KML
+# document, one GeoJSON FeatureCollection or newline-delimited GeoJSON
+# features. The stream is flushed after every surface so a caller reading it
+# (the API worker) can forward each surface as soon as it is written.
+from xml.sax.saxutils import escape, quoteattr
+import json
+
+import numpy as np
+
+KML_HEADER = (
+    '<?xml version="1.0" encoding="utf-8" ?>\n'
+    '<kml xmlns="http://www.opengis.net/kml/2.2">\n'
+    '<Document id="root_doc">\n'
+)
+KML_FOOTER = '</Document></kml>\n'
+KML_STYLE = (
+    '<Style><LineStyle><color>ff0000ff</color></LineStyle>'
+    '<PolyStyle><fill>0</fill></PolyStyle></Style>'
+)
+
+CONTENT_TYPES = {
+    "kml": "application/vnd.google-earth.kml+xml",
+    "geojson": "application/geo+json",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def closed_ring(polygon):
+    """Return polygon as an (n, 3) float array whose last vertex repeats the first."""
+    ring = np.asarray(polygon, dtype=np.float64)
+    if len(ring) and not np.array_equal(ring[0], ring[-1]):
+        ring = np.concatenate([ring, ring[:1]])
+    return ring
+
+
+def _format_number(value):
+    return '%.15g' % value
+
+
+def _kml_coordinates(ring):
+    return ' '.join(','.join(map(_format_number, vertex)) for vertex in ring.tolist())
+
+
+def write_kml(surfaces, stream):
+    """
+    Write surfaces as one KML document with a Folder per surface.
+
+    Parameters
+    ----------
+    surfaces : iterable
+        (layer_name, polygons) pairs; polygons are sequences of
+        (lon, lat, z) vertices.
+    stream : file-like
+        Text stream to write to.
+    """
+    stream.write(KML_HEADER)
+    for layer_name, polygons in surfaces:
+        # Names contain the runway designators of the request
+        parts = ['<Folder><name>', escape(layer_name), '</name>\n']
+        for i, polygon in enumerate(polygons, start=1):
+            parts += [
+                '  <Placemark id=', quoteattr(layer_name + '.' + str(i)), '>\n',
+                '\t', KML_STYLE, '\n',
+                '      <Polygon><outerBoundaryIs><LinearRing><coordinates>',
+                _kml_coordinates(closed_ring(polygon)),
+                '</coordinates></LinearRing></outerBoundaryIs></Polygon>\n',
+                '  </Placemark>\n',
+            ]
+        parts.append('</Folder>\n')
+        stream.write(''.join(parts))
+        stream.flush()
+    stream.write(KML_FOOTER)
+    stream.flush()
+
+
+def _features(layer_name, polygons):
+    for polygon in polygons:
+        yield {
+            "type": "Feature",
+            "properties": {"name": layer_name},
+            "geometry": {
+                "type": "Polygon",
+                "coordinates": [closed_ring(polygon).tolist()],
+            },
+        }
+
+
+def write_geojson(surfaces, stream):
+    """Write surfaces as one GeoJSON FeatureCollection, see write_kml."""
+    stream.write('{"type": "FeatureCollection", "features": [\n')
+    separator = ''
+    for layer_name, polygons in surfaces:
+        for feature in _features(layer_name, polygons):
+            stream.write(separator + json.dumps(feature))
+            separator = ',\n'
+        stream.flush()
+    stream.write('\n]}\n')
+    stream.flush()
+
+
+def write_ndjson(surfaces, stream):
+    """Write surfaces as one GeoJSON Feature per line, see write_kml."""
+    for layer_name, polygons in surfaces:
+        for feature in _features(layer_name, polygons):
+            stream.write(json.dumps(feature) + '\n')
+        stream.flush()
+
+
+WRITERS = {
+    "kml": write_kml,
+    "geojson": write_geojson,
+    "ndjson": write_ndjson,
+}
+
+
+def write_surfaces(surfaces, stream, format="kml"):
+    """Write surfaces to stream in the given format ("kml", "geojson" or "ndjson")."""
+    try:
+        writer = WRITERS[format]
+    except KeyError:
+        raise ValueError("Unknown output format: " + str(format))
+    writer(surfaces, stream)
@@ -0,0 +1,146 @@
+# Synthetic Aerodromes
+#
+# Reproducible random aerodromes for benchmarks and load tests. Runways have
+# realistic dimensions, headings and designators, and lie in northern
+# hemisphere UTM zones all around the globe.
+#
+# Usage:
+#   python -m surfaces.synthetic COUNT [--seed N] [--runways N] > aerodromes.jsonl
+#
+# The output is JSON-lines in the input layout of surfaces.batch.
+from dataclasses import asdict
+import argparse
+import math
+import json
+
+import numpy as np
+
+from .models import Aerodrome, Runway, RunwayEnd, TFPAParameters
+
+METRES_PER_DEGREE = 111320.0
+
+# The usual Annex 4 type A chart parameters
+DEFAULT_TFPA = TFPAParameters(length=10000, inner_width=180, divergence=0.125,
+                              final_width=1800, slope=0.012)
+
+
+def to_DDMMSS(value):
+    """Format decimal degrees as a DDMMSS.SS string, the inverse of DDMMSS_to_decimal."""
+    sign = "-" if value < 0 else ""
+    value = abs(value)
+    degrees = int(value)
+    minutes = int((value - degrees) * 60)
+    seconds = (value - degrees - minutes / 60) * 3600
+    if seconds >= 59.995:
+        minutes, seconds = minutes + 1, 0.0
+    if minutes == 60:
+        degrees, minutes = degrees + 1, 0
+    return "%s%d%02d%05.2f" % (sign, degrees, minutes, seconds)
+
+
+def _offset(lat, lon, distance, bearing):
+    """Move a decimal degree point by distance metres along bearing (degrees)."""
+    bearing = math.radians(bearing)
+    lat2 = lat + distance * math.cos(bearing) / METRES_PER_DEGREE
+    lon2 = lon + distance * math.sin(bearing) / (METRES_PER_DEGREE * math.cos(math.radians(lat)))
+    return lat2, lon2
+
+
+def _designator(heading):
+    number = int(round(heading / 10)) % 36
+    return "%02d" % (number or 36)
+
+
+def synthetic_runway(rng, lat, lon, elevation):
+    """A random runway near (lat, lon) in decimal degrees."""
+    length = int(rng.integers(120, 400)) * 10
+    width = int(rng.choice([30, 45, 60]))
+    heading = float(rng.uniform(0, 180))
+    centre = _offset(lat, lon, float(rng.uniform(0, 1500)), float(rng.uniform(0, 360)))
+
+    # The threshold of runway "16" is at the end aircraft landing on a
+    # heading of 160 degrees start from; its runway end is the far end,
+    # behind the opposite threshold.
+    directions = ((heading, heading + 180), (heading + 180, heading))
+    thresholds = [_offset(*centre, length / 2, outward) for _, outward in directions]
+    extremities = [_offset(*threshold, float(rng.uniform(0, 120)), outward)
+                   for threshold, (_, outward) in zip(thresholds, directions)]
+    elevations = [round(elevation + float(rng.uniform(-5, 5)), 1) for _ in directions]
+
+    ends = []
+    for i, (landing, _) in enumerate(directions):
+        end = extremities[1 - i]
+        ends.append(RunwayEnd(
+            designator=_designator(landing),
+            threshold_lat=to_DDMMSS(thresholds[i][0]),
+            threshold_lon=to_DDMMSS(thresholds[i][1]),
+            threshold_elev=elevations[i],
+            end_lat=to_DDMMSS(end[0]),
+            end_lon=to_DDMMSS(end[1]),
+            end_elev=round(elevations[1 - i] + float(rng.uniform(-1, 1)), 1),
+            clearway=float(rng.choice([0, 0, 60, 150, 300])),
+        ))
+
+    return Runway(end1=ends[0], end2=ends[1], length=length, width=width,
+                  strip_length=length + 120, strip_width=300 if length >= 1200 else 150)
+
+
+def _icao(i):
+    letters = ""
+    for _ in range(3):
+        i, r = divmod(i, 26)
+        letters = chr(ord("A") + r) + letters
+    return "S" + letters
+
+
+def synthetic_aerodromes(count, seed=0, runways=1, tfpa=True):
+    """
+    Generate count random aerodromes.
+
+    Parameters
+    ----------
+    count : int
+        Number of aerodromes.
+    seed : int
+        Random seed; the same seed always gives the same aerodromes.
+    runways : int
+        Runways per aerodrome.
+    tfpa : bool
+        Give every aerodrome the default TFPA parameters.
+
+    Returns
+    -------
+    list
+        List of Aerodrome.
+    """
+    rng = np.random.default_rng(seed)
+    aerodromes = []
+    for i in range(count):
+        lat = float(rng.uniform(5, 60))
+        lon = float(rng.uniform(-175, 175))
+        elevation = round(float(rng.uniform(0, 1500)))
+        aerodromes.append(Aerodrome(
+            icao=_icao(i),
+            arp_lat=to_DDMMSS(lat),
+            arp_lon=to_DDMMSS(lon),
+            ref_elev=elevation,
+            runways=[synthetic_runway(rng, lat, lon, elevation) for _ in range(runways)],
+            tfpa=DEFAULT_TFPA if tfpa else None,
+        ))
+    return aerodromes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write random aerodromes as JSON-lines.")
+    parser.add_argument("count", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--runways", type=int, default=1, help="runways per aerodrome")
+    parser.add_argument("--no-tfpa", action="store_true", help="leave out the TFPA parameters")
+    args = parser.parse_args(argv)
+
+    for aerodrome in synthetic_aerodromes(args.count, args.seed, args.runways, not args.no_tfpa):
+        print(json.dumps(asdict(aerodrome)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# TFPA Surfaces (Annex 4)
+import io
+
+import numpy as np
+
+from .geometry import sort_thresholds, simplify_surfaces
+from .projection import surfaces_to_geographic, utm_epsg
+from .kernel import tfpa_batch
+from .serialize import write_surfaces
+from . import timing
+
+
+def tfpa(t,w,l,w_f,s,div,azimuth):
+
+    if t[-1] < 0:
+        azimuth_tfpa =  azimuth
+    else:
+        azimuth_tfpa =  azimuth - 180
+
+    ends = np.array([t[4:7]], dtype=np.float64)
+    clearway = np.array([t[7]], dtype=np.float64)
+    return tfpa_batch(ends, clearway, azimuth_tfpa, w, l, w_f, s, div)[0].tolist()
+
+
+def tfpa_surfaces(runway, params, simplify=None):
+    """
+    Build the take-off flight path area of both ends of a runway.
+
+    Parameters
+    ----------
+    runway : Runway
+        Runway to build the surfaces for.
+    params : TFPAParameters
+        Dimensions of the take-off flight path area.
+    simplify : float, optional
+        Tolerance in metres of a topology preserving simplification applied
+        to every polygon.
+
+    Returns
+    -------
+    tuple
+        Tuple of the EPSG code the vertices are in and a dict mapping surface
+        names (e.g. "TFPA_RWY16") to lists of polygons.
+    """
+    with timing.stage("project"):
+        epsg = utm_epsg(runway.end1.threshold_lat, runway.end1.threshold_lon)
+        t1, t2, azimuth = sort_thresholds(runway, epsg)
+
+    with timing.stage("geometry"):
+        surfaces = {}
+        for t in (t1, t2):
+            surfaces["TFPA_RWY" + t[3]] = [tfpa(t, params.inner_width, params.length,
+                                                params.final_width, params.slope,
+                                                params.divergence, azimuth)]
+    if simplify:
+        with timing.stage("simplify"):
+            surfaces = simplify_surfaces(surfaces, simplify)
+    return epsg, surfaces
+
+
+def write_tfpa(runway, params, stream, format="kml", lod=None, simplify=None):
+    """
+    Generate the TFPA surfaces of one runway and write them to stream as one
+    KML (or GeoJSON / NDJSON) document, flushing after every surface.
+
+    lod is accepted for symmetry with write_etod; the TFPA has no arcs, so
+    every level of detail gives the same polygons.
+    """
+    epsg, surfaces = tfpa_surfaces(runway, params, simplify)
+    with timing.stage("to_geographic"):
+        surfaces = surfaces_to_geographic(surfaces, epsg)
+    with timing.stage("serialize"):
+        write_surfaces(surfaces.items(), stream, format)
+
+
+def tfpa_kml(runway, params, format="kml", lod=None, simplify=None):
+    """Generate the TFPA surfaces of one runway as a KML document string."""
+    output = io.StringIO()
+    write_tfpa(runway, params, output, format, lod, simplify)
+    return output.getvalue()
@@ -0,0 +1,121 @@
+# Stage Timers
+#
+# Per-stage wall clock times of a generator run, off unless asked for with
+# --timing on the generator command line, "timing": true in a worker request
+# or SURFACE_TIMING=1 in the environment. A timed run writes one JSON line
+# to stderr:
+#
+#   {"timing": "etod", "stages_ms": {"import": 180.2, "project": 1.1,
+#    "geometry": 0.9, "to_geographic": 0.4, "serialize": 2.3}, "total_ms": 185.1}
+#
+# Stages:
+#   import         module imports, only reported by the first run of a process
+#   cache_get      result cache lookup
+#   project        projecting the runway and ARP coordinates to UTM
+#   geometry       building the polygons
+#   simplify       optional polygon simplification
+#   to_geographic  converting the polygons back to WGS 84
+#   serialize      writing the document
+#   cache_put      storing the result in the cache
+from contextlib import contextmanager, nullcontext
+import time
+import json
+import sys
+import os
+
+ENV = "SURFACE_TIMING"
+
+_current = None
+_import_seconds = {}
+
+
+class StageTimer:
+    """Accumulates the time spent in each named stage."""
+
+    def __init__(self):
+        self.stages = {}
+
+    def record(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+
+def enabled_by_env():
+    return os.environ.get(ENV, "") not in ("", "0")
+
+
+def stage(name):
+    """Time the enclosed block as stage name of the current run, if any."""
+    if _current is None:
+        return nullcontext()
+    return _current.stage(name)
+
+
+def record(name, seconds):
+    """Add seconds to stage name of the current run, if any."""
+    if _current is not None:
+        _current.record(name, seconds)
+
+
+def imports_done(name, started):
+    """Remember how long the imports of script name took since started
+    (a time.perf_counter value)."""
+    _import_seconds[name] = time.perf_counter() - started
+
+
+def record_imports(name):
+    """Add the import time of script name to the current run, once per process."""
+    if _current is not None and name in _import_seconds:
+        _current.record("import", _import_seconds.pop(name))
+
+
+@contextmanager
+def timed(label, enabled=None, stream=None):
+    """
+    Collect the stage times of the enclosed block and write them to stream
+    (stderr) as one JSON line once it finishes.
+
+    Parameters
+    ----------
+    label : str
+        Name of the run, e.g. the generator.
+    enabled : bool, optional
+        Defaults to the SURFACE_TIMING environment variable. When false the
+        block runs untimed and None is yielded.
+    stream : file-like, optional
+        Where to write the result, defaults to sys.stderr.
+
+    Yields
+    ------
+    StageTimer or None
+    """
+    global _current
+    if enabled is None:
+        enabled = enabled_by_env()
+    if not enabled:
+        yield None
+        return
+
+    timer = StageTimer()
+    previous, _current = _current, timer
+    start = time.perf_counter()
+    try:
+        yield timer
+    finally:
+        _current = previous
+        total = time.perf_counter() - start + timer.stages.get("import", 0.0)
+        report = {
+            "timing": label,
+            "stages_ms": {name: round(seconds * 1000, 3) for name, seconds in timer.stages.items()},
+            "total_ms": round(total * 1000, 3),
+        }
+        stream = stream or sys.stderr
+        stream.write(json.dumps(report) + "\n")
+        stream.flush()
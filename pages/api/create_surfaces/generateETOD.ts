@@ -1,5 +1,13 @@
-import { spawn, ChildProcess } from "child_process";
 import Cors from "cors";
+import {
+  runSurfaceGenerator,
+  surfaceContentTypes,
+  SurfaceFormat,
+  SurfaceLevelOfDetail,
+  surfaceLevelsOfDetail,
+  WorkerPoolBusyError,
+  WorkerTimeoutError,
+} from "@/lib/surfaceWorkerPool";
 import { NextApiRequest, NextApiResponse } from "next";
 
 const cors = Cors({
@@ -48,70 +56,77 @@ export default async function handler(
           ref_elev,
         } = req.body;
 
-        const pythonScriptPath = "external/pythonscripts/generate_eTOD.py";
+        const format: SurfaceFormat = req.body.format ?? "kml";
+        const lod: SurfaceLevelOfDetail = req.body.lod ?? "standard";
+        const simplify: number | undefined = req.body.simplify;
+        if (
+          !Object.prototype.hasOwnProperty.call(surfaceContentTypes, format) ||
+          !surfaceLevelsOfDetail.includes(lod) ||
+          (simplify !== undefined &&
+            !(typeof simplify === "number" && simplify >= 0))
+        ) {
+          res.status(400).json({ error: "Bad Request" });
+          return;
+        }
 
-        const process: ChildProcess = spawn("python", [
-          pythonScriptPath,
-          airportCode,
-          e1_lat,
-          e1_lon,
-          e1_elev,
-          e1_rwy,
-          e2_lat,
-          e2_lon,
-          e2_elev,
-          e2_rwy,
-          r1e_lat,
-          r1e_lon,
-          r1e_elev,
-          r2e_lat,
-          r2e_lon,
-          r2e_elev,
-          arp_lat,
-          arp_lon,
-          cwy1,
-          cwy2,
-          runwayLength,
-          runwayWidth,
-          strip_length,
-          strip_width,
-          ref_elev,
-        ]);
-
-        let scriptOutput = "";
-        let scriptError = "";
-
-        process.stdout?.on("data", (data: Buffer) => {
-          scriptOutput += data.toString();
-        });
-
-        process.stderr?.on("data", (data: Buffer) => {
-          scriptError += data.toString();
-        });
-
-        process.on("close", (code) => {
-          if (code !== 0) {
-            console.log("Error executing Python script. Exit code:", code);
-            console.log("Script Error:", scriptError);
-            res.status(500).json({ error: "Server Error" });
-          } else {
+        runSurfaceGenerator(
+          "etod",
+          [
+            airportCode,
+            e1_lat,
+            e1_lon,
+            e1_elev,
+            e1_rwy,
+            e2_lat,
+            e2_lon,
+            e2_elev,
+            e2_rwy,
+            r1e_lat,
+            r1e_lon,
+            r1e_elev,
+            r2e_lat,
+            r2e_lon,
+            r2e_elev,
+            arp_lat,
+            arp_lon,
+            cwy1,
+            cwy2,
+            runwayLength,
+            runwayWidth,
+            strip_length,
+            strip_width,
+            ref_elev,
+          ],
+          { format, lod, simplify },
+          (chunk: string) => {
+            if (!res.headersSent) {
+              res.setHeader("Content-Type", surfaceContentTypes[format]);
+              res.status(200);
+            }
+            res.write(chunk);
+          }
+        )
+          .then(() => {
             console.log("Python script executed successfully.");
-            try {
-              // Send the KML data as the response
-              res.setHeader(
-                "Content-Type",
-                "application/vnd.google-earth.kml+xml"
-              );
-
-              res.status(200).send(scriptOutput);
-              // console.log("KML data sent as response.");
-              // console.log("KML data:", scriptOutput);
-            } catch (error) {
-              console.error("Error sending KML response:", error);
+            res.end();
+          })
+          .catch((error: Error) => {
+            if (res.headersSent) {
+              // Part of the document is already on its way, cut the response
+              // short so the client sees it as failed.
+              console.log("Error executing Python script:", error.message);
+              res.destroy();
+            } else if (error instanceof WorkerPoolBusyError) {
+              res.setHeader("Retry-After", "1");
+              res.status(503).json({ error: "Server Busy" });
+            } else if (error instanceof WorkerTimeoutError) {
+              console.log("Python script timed out:", error.message);
+              res.status(504).json({ error: "Gateway Timeout" });
+            } else {
+              console.log("Error executing Python script:", error.message);
               res.status(500).json({ error: "Server Error" });
             }
-          }
-        });
+          });
       } else {
         console.log("Invalid request method. Expected POST.");
         res.status(405).json({ error: "Method Not Allowed" });
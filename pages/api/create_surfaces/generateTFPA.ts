@@ -1,6 +1,14 @@
 import { NextApiRequest, NextApiResponse } from "next";
-import { spawn, ChildProcess } from "child_process";
 import Cors from "cors";
+import {
+  runSurfaceGenerator,
+  surfaceContentTypes,
+  SurfaceFormat,
+  SurfaceLevelOfDetail,
+  surfaceLevelsOfDetail,
+  WorkerPoolBusyError,
+  WorkerTimeoutError,
+} from "@/lib/surfaceWorkerPool";
 
 const cors = Cors({
   origin: "*",
@@ -47,62 +55,75 @@ export default async function handler(
           tfpa_slope,
         } = req.body;
 
-        const pythonScriptPath = "external/pythonscripts/generate_TFPA.py";
+        const format: SurfaceFormat = req.body.format ?? "kml";
+        const lod: SurfaceLevelOfDetail = req.body.lod ?? "standard";
+        const simplify: number | undefined = req.body.simplify;
+        if (
+          !Object.prototype.hasOwnProperty.call(surfaceContentTypes, format) ||
+          !surfaceLevelsOfDetail.includes(lod) ||
+          (simplify !== undefined &&
+            !(typeof simplify === "number" && simplify >= 0))
+        ) {
+          res.status(400).json({ error: "Bad Request" });
+          return;
+        }
 
-        const process: ChildProcess = spawn("python", [
-          pythonScriptPath,
-          airportCode,
-          e1_lat,
-          e1_lon,
-          e1_elev,
-          e1_rwy,
-          e2_lat,
-          e2_lon,
-          e2_elev,
-          e2_rwy,
-          r1e_lat,
-          r1e_lon,
-          r1e_elev,
-          r2e_lat,
-          r2e_lon,
-          r2e_elev,
-          cwy1,
-          cwy2,
-          tfpa_length,
-          tfpa_inner_length,
-          tfpa_div,
-          tfpa_finalWidth,
-          tfpa_slope,
-        ]);
-
-        let scriptOutput = "";
-        let scriptError = "";
-
-        process.stdout?.on("data", (data: Buffer) => {
-          scriptOutput += data.toString();
-        });
-
-        process.stderr?.on("data", (data: Buffer) => {
-          scriptError += data.toString();
-        });
-
-        process.on("close", (code: number) => {
-          if (code !== 0) {
-            console.log("Error");
-          } else {
-            try {
-              res.setHeader(
-                "Content-Type",
-                "application/vnd.google-earth.kml+xml"
-              );
-
-              res.status(200).send(scriptOutput);
-              //console.log(scriptOutput);
-            } catch (error) {
-              console.log("Error");
+        runSurfaceGenerator(
+          "tfpa",
+          [
+            airportCode,
+            e1_lat,
+            e1_lon,
+            e1_elev,
+            e1_rwy,
+            e2_lat,
+            e2_lon,
+            e2_elev,
+            e2_rwy,
+            r1e_lat,
+            r1e_lon,
+            r1e_elev,
+            r2e_lat,
+            r2e_lon,
+            r2e_elev,
+            cwy1,
+            cwy2,
+            tfpa_length,
+            tfpa_inner_length,
+            tfpa_div,
+            tfpa_finalWidth,
+            tfpa_slope,
+          ],
+          { format, lod, simplify },
+          (chunk: string) => {
+            if (!res.headersSent) {
+              res.setHeader("Content-Type", surfaceContentTypes[format]);
+              res.status(200);
             }
+            res.write(chunk);
           }
-        });
+        )
+          .then(() => {
+            console.log("Python script executed successfully.");
+            res.end();
+          })
+          .catch((error: Error) => {
+            if (res.headersSent) {
+              // Part of the document is already on its way, cut the response
+              // short so the client sees it as failed.
+              console.log("Error executing Python script:", error.message);
+              res.destroy();
+            } else if (error instanceof WorkerPoolBusyError) {
+              res.setHeader("Retry-After", "1");
+              res.status(503).json({ error: "Server Busy" });
+            } else if (error instanceof WorkerTimeoutError) {
+              console.log("Python script timed out:", error.message);
+              res.status(504).json({ error: "Gateway Timeout" });
+            } else {
+              console.log("Error executing Python script:", error.message);
+              res.status(500).json({ error: "Server Error" });
+            }
+          });
       } else {
         res.status(405).json({ error: "Method Not Allowed" });
       }
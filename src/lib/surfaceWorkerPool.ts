@@ -0,0 +1,276 @@
+import { spawn, ChildProcess } from "child_process";
+import readline from "readline";
+import os from "os";
+
+// Pool of warm Python processes running external/pythonscripts/surface_worker.py.
+// Each worker imports the generators once and then answers JSON-lines requests,
+// so API calls no longer pay interpreter startup and numpy/pyproj imports.
+// Output is passed on in chunks, one surface at a time, as the worker sends it.
+
+export type SurfaceGenerator = "etod" | "tfpa";
+
+export type SurfaceFormat = "kml" | "geojson" | "ndjson";
+
+export const surfaceContentTypes: Record<SurfaceFormat, string> = {
+  kml: "application/vnd.google-earth.kml+xml",
+  geojson: "application/geo+json",
+  ndjson: "application/x-ndjson",
+};
+
+// Arc densification: survey (0.1 m chord tolerance), standard (1 degree steps)
+// or preview (25 m chord tolerance).
+export type SurfaceLevelOfDetail = "survey" | "standard" | "preview";
+
+export const surfaceLevelsOfDetail: SurfaceLevelOfDetail[] = [
+  "survey",
+  "standard",
+  "preview",
+];
+
+export interface SurfaceOptions {
+  format: SurfaceFormat;
+  lod?: SurfaceLevelOfDetail;
+  // Topology preserving simplification tolerance in metres.
+  simplify?: number;
+}
+
+export class WorkerPoolBusyError extends Error {
+  constructor() {
+    super("Surface worker queue is full");
+    this.name = "WorkerPoolBusyError";
+  }
+}
+
+export class WorkerTimeoutError extends Error {
+  constructor(timeoutMs: number) {
+    super(`Surface worker did not answer within ${timeoutMs} ms`);
+    this.name = "WorkerTimeoutError";
+  }
+}
+
+const workerScriptPath = "external/pythonscripts/surface_worker.py";
+
+const poolSize =
+  Number(process.env.SURFACE_WORKERS) || Math.min(os.cpus().length, 4);
+const maxQueueLength = Number(process.env.SURFACE_WORKER_QUEUE) || 32;
+const requestTimeoutMs =
+  Number(process.env.SURFACE_WORKER_TIMEOUT_MS) || 30000;
+const restartDelayMs = 1000;
+
+interface Job {
+  id: number;
+  generator: SurfaceGenerator;
+  args: unknown[];
+  options: SurfaceOptions;
+  onChunk: (chunk: string) => void;
+  resolve: () => void;
+  reject: (error: Error) => void;
+  timer?: NodeJS.Timeout;
+}
+
+interface Worker {
+  process: ChildProcess;
+  ready: boolean;
+  job?: Job;
+  stderr: string;
+}
+
+class SurfaceWorkerPool {
+  private workers: Worker[] = [];
+  private queue: Job[] = [];
+  private nextJobId = 1;
+
+  constructor(size: number) {
+    for (let i = 0; i < size; i++) {
+      this.workers.push(this.startWorker());
+    }
+  }
+
+  run(
+    generator: SurfaceGenerator,
+    args: unknown[],
+    options: SurfaceOptions,
+    onChunk: (chunk: string) => void
+  ): Promise<void> {
+    if (this.queue.length >= maxQueueLength) {
+      return Promise.reject(new WorkerPoolBusyError());
+    }
+
+    return new Promise<void>((resolve, reject) => {
+      const job: Job = {
+        id: this.nextJobId++,
+        generator,
+        args,
+        options,
+        onChunk,
+        resolve,
+        reject,
+      };
+      // The deadline covers the wait for a worker too, so requests do not
+      // hang while no worker becomes ready.
+      job.timer = setTimeout(() => this.onTimeout(job), requestTimeoutMs);
+      this.queue.push(job);
+      this.dispatch();
+    });
+  }
+
+  private startWorker(): Worker {
+    const child = spawn("python", [workerScriptPath]);
+    const worker: Worker = { process: child, ready: false, stderr: "" };
+
+    readline
+      .createInterface({ input: child.stdout! })
+      .on("line", (line: string) => this.onMessage(worker, line));
+
+    child.stderr?.on("data", (data: Buffer) => {
+      // Only the tail is kept, it is what gets logged when a job fails.
+      worker.stderr = (worker.stderr + data.toString()).slice(-4096);
+    });
+
+    child.on("error", (error: Error) => {
+      console.error("Surface worker failed to start:", error);
+    });
+
+    // Writing to a worker that just died fails with EPIPE; onExit rejects
+    // its job, this only keeps the error from crashing the server.
+    child.stdin?.on("error", (error: Error) => {
+      console.error("Surface worker stdin error:", error.message);
+    });
+
+    child.on("exit", (code, signal) => this.onExit(worker, code, signal));
+
+    return worker;
+  }
+
+  private onMessage(worker: Worker, line: string) {
+    let message: any;
+    try {
+      message = JSON.parse(line);
+    } catch (error) {
+      console.error("Surface worker sent invalid output:", line);
+      return;
+    }
+
+    if (message.ready) {
+      worker.ready = true;
+      this.dispatch();
+      return;
+    }
+
+    const job = worker.job;
+    if (!job || message.id !== job.id) {
+      return;
+    }
+
+    if (message.chunk !== undefined) {
+      job.onChunk(message.chunk);
+      return;
+    }
+
+    clearTimeout(job.timer);
+    worker.job = undefined;
+
+    if (message.ok) {
+      job.resolve();
+    } else {
+      console.log("Script Error:", worker.stderr);
+      job.reject(new Error(message.error));
+    }
+    worker.stderr = "";
+
+    this.dispatch();
+  }
+
+  private onExit(
+    worker: Worker,
+    code: number | null,
+    signal: NodeJS.Signals | null
+  ) {
+    console.log("Surface worker exited. Code:", code, "Signal:", signal);
+
+    const job = worker.job;
+    if (job) {
+      clearTimeout(job.timer);
+      worker.job = undefined;
+      console.log("Script Error:", worker.stderr);
+      job.reject(new Error("Surface worker exited while running a job"));
+    }
+
+    const index = this.workers.indexOf(worker);
+    if (index === -1) {
+      return;
+    }
+
+    // A worker that dies before it ever became ready is most likely broken
+    // (missing Python packages, bad path), so do not restart it in a hot loop.
+    const delay = worker.ready ? 0 : restartDelayMs;
+    setTimeout(() => {
+      this.workers[index] = this.startWorker();
+    }, delay);
+  }
+
+  private onTimeout(job: Job) {
+    const index = this.queue.indexOf(job);
+    if (index !== -1) {
+      this.queue.splice(index, 1);
+    } else {
+      const worker = this.workers.find((worker) => worker.job === job);
+      if (worker) {
+        // The worker is stuck on this job; kill it and let onExit restart it.
+        worker.job = undefined;
+        worker.process.kill("SIGKILL");
+      }
+    }
+    job.reject(new WorkerTimeoutError(requestTimeoutMs));
+  }
+
+  private dispatch() {
+    for (const worker of this.workers) {
+      if (this.queue.length === 0) {
+        return;
+      }
+      // A killed worker stays in the list until its exit event arrives.
+      if (
+        !worker.ready ||
+        worker.job ||
+        worker.process.killed ||
+        worker.process.exitCode !== null
+      ) {
+        continue;
+      }
+
+      const job = this.queue.shift()!;
+      worker.job = job;
+
+      worker.process.stdin?.write(
+        JSON.stringify({
+          id: job.id,
+          generator: job.generator,
+          format: job.options.format,
+          lod: job.options.lod,
+          simplify: job.options.simplify,
+          args: job.args,
+        }) + "\n"
+      );
+    }
+  }
+}
+
+// Next.js re-evaluates API modules on hot reload, keep one pool per server.
+const globalForPool = globalThis as unknown as {
+  surfaceWorkerPool?: SurfaceWorkerPool;
+};
+
+// Runs a generator on a pooled worker. onChunk receives the output as it is
+// produced; the promise resolves once the whole document has been sent.
+export function runSurfaceGenerator(
+  generator: SurfaceGenerator,
+  args: unknown[],
+  options: SurfaceOptions,
+  onChunk: (chunk: string) => void
+): Promise<void> {
+  if (!globalForPool.surfaceWorkerPool) {
+    globalForPool.surfaceWorkerPool = new SurfaceWorkerPool(poolSize);
+  }
+  return globalForPool.surfaceWorkerPool.run(generator, args, options, onChunk);
+}